@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Gunicorn Configuration for the Sample Application
+Single gthread worker sized for AWS t2.micro (1 vCPU)
+
+Run from the project root: gunicorn -c gunicorn_conf.py
+"""
+
+bind = '0.0.0.0:5000'
+workers = 1
+# Handlers mostly sleep to simulate backend latency; a sleeping thread
+# releases the GIL, so extra threads overlap requests at little RSS cost
+threads = 16
+worker_class = 'gthread'
+timeout = 30
+
+# Importing the app starts the log listener and flusher threads, which do
+# not survive fork(); load it in the worker rather than the master
+preload_app = False
+
+pythonpath = 'src/app,src'
+wsgi_app = 'sample_app:app'
+
+def post_worker_init(worker):
+    """Start the simulated background activity inside the worker"""
+    from sample_app import start_background_activity
+    start_background_activity()
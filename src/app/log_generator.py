@@ -4,18 +4,56 @@ Log Generator for Sample Application
 Simulates various log patterns that would be seen in production
 """
 
+import itertools
+import json
 import logging
 import random
 import time
 from datetime import datetime, timedelta
 from typing import Dict, Any
 
+import numpy as np
+
+from log_utils import now_iso
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+# Random picks drawn per NumPy call; refilled when a batch is used up
+SAMPLE_BATCH_SIZE = 4096
+
 class LogGenerator:
     """Generates realistic application logs for testing anomaly detection"""
     
+    # %-templates take the str.__mod__ fast path instead of f-string bytecode
+    _REQID_FMT = 'req_%06d'
+    _NORMAL_MSG_FMT = '%s %s - %d - %.2fms'
+    _ERROR_MSG_FMT = 'ERROR in %s %s: %s - %s'
+    _WARNING_MSG_FMT = 'WARNING in %s %s: %s'
+    
+    # Endpoints hit by the traffic simulator
+    _TRAFFIC_ENDPOINTS = (
+        ('/', 'GET'),
+        ('/api/users', 'GET'),
+        ('/api/orders', 'POST'),
+        ('/api/products', 'GET'),
+        ('/api/health', 'GET')
+    )
+    
+    # The simulated frames never change, so the trace is one template
+    _STACK_TRACE_FMT = '%s: Simulated error\n' + '\n'.join([
+        'File "/opt/app/src/handlers.py", line 42, in process_request',
+        'File "/opt/app/src/services.py", line 128, in execute_operation',
+        'File "/opt/app/src/database.py", line 67, in query_database',
+        'File "/opt/app/src/utils.py", line 234, in validate_input'
+    ])
+    
     def __init__(self):
         self.logger = logging.getLogger('application')
-        self.request_counter = 0
+        # count.__next__ runs in C, so concurrent request threads never share an id
+        self._next_id = itertools.count(1).__next__
         self.error_patterns = [
             'DatabaseConnectionTimeout',
             'OutOfMemoryError',
@@ -55,62 +93,96 @@ class LogGenerator:
             '192.168.1.100', '10.0.0.50', '172.16.0.25',
             '203.0.113.1', '198.51.100.10', '192.0.2.100'
         ]
+        
+        self._rng = np.random.default_rng()
+        self._refill_batches()
+    
+    def _refill_batches(self):
+        """Pre-draw a batch of random picks so per-record sampling is a list index"""
+        rng, n = self._rng, SAMPLE_BATCH_SIZE
+        self._ip_batch = rng.choice(self.ip_addresses, n).tolist()
+        self._ua_batch = rng.choice(self.user_agents, n).tolist()
+        self._err_batch = rng.choice(self.error_patterns, n).tolist()
+        # (delay, endpoint, error draw, response time) uniforms for the traffic loop
+        self._uniform_batch = rng.random((n, 4)).tolist()
+        self._batch_pos = 0
+    
+    def _next_sample(self) -> int:
+        """Return the next unused batch position, refilling when the batch runs out"""
+        # Every batch list has SAMPLE_BATCH_SIZE entries, so a position taken
+        # before another thread refills is still a valid index afterwards
+        pos = self._batch_pos
+        if pos >= SAMPLE_BATCH_SIZE:
+            self._refill_batches()
+            pos = 0
+        self._batch_pos = pos + 1
+        return pos
     
     def generate_normal_log(self, endpoint: str, method: str, status_code: int, response_time: float):
         """Generate a normal application log entry"""
-        self.request_counter += 1
+        if not self.logger.isEnabledFor(logging.INFO):
+            return  # Skip building and encoding a record nobody will keep
+        
+        request_id = self._REQID_FMT % self._next_id()
+        pos = self._next_sample()
         
         log_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now_iso(),
             'level': 'INFO',
-            'request_id': f"req_{self.request_counter:06d}",
+            'request_id': request_id,
             'method': method,
             'endpoint': endpoint,
             'status_code': status_code,
             'response_time_ms': round(response_time, 2),
-            'client_ip': random.choice(self.ip_addresses),
-            'user_agent': random.choice(self.user_agents),
-            'message': f"{method} {endpoint} - {status_code} - {response_time:.2f}ms"
+            'client_ip': self._ip_batch[pos],
+            'user_agent': self._ua_batch[pos],
+            'message': self._NORMAL_MSG_FMT % (method, endpoint, status_code, response_time)
         }
         
         self.logger.info(json_format(log_data))
     
     def generate_error_log(self, endpoint: str, method: str, error_type: str, error_message: str):
         """Generate an error log entry"""
-        self.request_counter += 1
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        
+        request_id = self._REQID_FMT % self._next_id()
         
         # Simulate stack trace
         stack_trace = self._generate_stack_trace(error_type)
         
         log_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now_iso(),
             'level': 'ERROR',
-            'request_id': f"req_{self.request_counter:06d}",
+            'request_id': request_id,
             'method': method,
             'endpoint': endpoint,
             'error_type': error_type,
             'error_message': error_message,
             'stack_trace': stack_trace,
-            'client_ip': random.choice(self.ip_addresses),
-            'message': f"ERROR in {method} {endpoint}: {error_type} - {error_message}"
+            'client_ip': self._ip_batch[self._next_sample()],
+            'message': self._ERROR_MSG_FMT % (method, endpoint, error_type, error_message)
         }
         
         self.logger.error(json_format(log_data))
     
     def generate_warning_log(self, endpoint: str, method: str, warning_type: str, response_time: float = None):
         """Generate a warning log entry"""
-        self.request_counter += 1
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
+        
+        request_id = self._REQID_FMT % self._next_id()
         
         log_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now_iso(),
             'level': 'WARNING',
-            'request_id': f"req_{self.request_counter:06d}",
+            'request_id': request_id,
             'method': method,
             'endpoint': endpoint,
             'warning_type': warning_type,
             'response_time_ms': round(response_time, 2) if response_time else None,
-            'client_ip': random.choice(self.ip_addresses),
-            'message': f"WARNING in {method} {endpoint}: {warning_type}"
+            'client_ip': self._ip_batch[self._next_sample()],
+            'message': self._WARNING_MSG_FMT % (method, endpoint, warning_type)
         }
         
         if response_time and response_time > 1000:
@@ -120,6 +192,9 @@ class LogGenerator:
     
     def generate_background_log(self):
         """Generate background task logs"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
         tasks = [
             'Database backup completed',
             'Cache refreshed successfully',
@@ -130,7 +205,7 @@ class LogGenerator:
         ]
         
         log_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now_iso(),
             'level': 'INFO',
             'component': 'background',
             'task': random.choice(tasks),
@@ -140,9 +215,11 @@ class LogGenerator:
         
         self.logger.info(json_format(log_data))
     
-    def generate_error_spike(self, count: int = 5):
+    def generate_error_spike(self, count: int = 5, pacing: bool = True):
         """Generate a spike of errors to simulate system issues"""
-        error_type = random.choice(self.error_patterns)
+        # Unpaced spikes go out back to back; the queued, buffered log
+        # handlers already coalesce them into a few writes
+        error_type = self._err_batch[self._next_sample()]
         
         for i in range(count):
             self.generate_error_log(
@@ -151,10 +228,22 @@ class LogGenerator:
                 error_type=error_type,
                 error_message=f'Simulated error spike #{i+1}'
             )
-            time.sleep(random.uniform(0.1, 0.5))
+            if pacing:
+                time.sleep(random.uniform(0.1, 0.5))
     
-    def generate_latency_spike(self, duration_seconds: int = 30):
+    def generate_latency_spike(self, duration_seconds: int = 30, pacing: bool = True):
         """Generate logs with high latency to simulate performance issues"""
+        if not pacing:
+            # Emit the ~duration/2 warnings a paced run would produce, immediately
+            for _ in range(max(1, duration_seconds // 2)):
+                self.generate_warning_log(
+                    endpoint='/api/slow',
+                    method='GET',
+                    warning_type='SlowResponseTime',
+                    response_time=random.uniform(1000, 3000)
+                )
+            return
+        
         start_time = time.time()
         
         while time.time() - start_time < duration_seconds:
@@ -168,14 +257,7 @@ class LogGenerator:
     
     def _generate_stack_trace(self, error_type: str) -> str:
         """Generate a realistic stack trace"""
-        stack_frames = [
-            f'File "/opt/app/src/handlers.py", line 42, in process_request',
-            f'File "/opt/app/src/services.py", line 128, in execute_operation',
-            f'File "/opt/app/src/database.py", line 67, in query_database',
-            f'File "/opt/app/src/utils.py", line 234, in validate_input'
-        ]
-        
-        return f"{error_type}: Simulated error\n" + "\n".join(stack_frames)
+        return self._STACK_TRACE_FMT % error_type
     
     def simulate_traffic_pattern(self):
         """Simulate realistic traffic patterns throughout the day"""
@@ -195,26 +277,28 @@ class LogGenerator:
             base_delay = 0.5
             error_probability = 0.01
         
+        # Bind loop invariants to locals once
+        endpoints = self._TRAFFIC_ENDPOINTS
+        n_endpoints = len(endpoints)
+        delay_span = base_delay * 2
+        next_sample = self._next_sample
+        sleep = time.sleep
+        
         # Simulate random requests
         while True:
             try:
+                pos = next_sample()
+                u_delay, u_endpoint, u_error, u_response = self._uniform_batch[pos]
+                
                 # Random delay between requests
-                time.sleep(random.uniform(base_delay, base_delay * 3))
+                sleep(base_delay + u_delay * delay_span)
                 
                 # Random endpoint selection
-                endpoints = [
-                    ('/', 'GET'),
-                    ('/api/users', 'GET'),
-                    ('/api/orders', 'POST'),
-                    ('/api/products', 'GET'),
-                    ('/api/health', 'GET')
-                ]
-                
-                endpoint, method = random.choice(endpoints)
+                endpoint, method = endpoints[int(u_endpoint * n_endpoints)]
                 
                 # Determine if this should be an error
-                if random.random() < error_probability:
-                    error_type = random.choice(self.error_patterns)
+                if u_error < error_probability:
+                    error_type = self._err_batch[pos]
                     self.generate_error_log(
                         endpoint=endpoint,
                         method=method,
@@ -223,7 +307,7 @@ class LogGenerator:
                     )
                 else:
                     # Normal request
-                    response_time = random.uniform(50, 300)
+                    response_time = 50 + u_response * 250
                     status_code = 200 if method == 'GET' else 201
                     
                     self.generate_normal_log(
@@ -239,7 +323,8 @@ class LogGenerator:
 
 def json_format(data: Dict[str, Any]) -> str:
     """Format dictionary as JSON string for logging"""
-    import json
+    if orjson is not None:
+        return orjson.dumps(data).decode()
     return json.dumps(data, separators=(',', ':'))
 
 # Example usage
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Logging Utilities
+Keeps log I/O off the request path for the Flask services
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from datetime import datetime
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Per-thread (iso_string, epoch) pair; Flask serves requests on many threads
+_ts_local = threading.local()
+
+
+def now_iso() -> str:
+    """Current UTC time in ISO format, re-rendered at most once per millisecond"""
+    t = time.time()
+    cached = getattr(_ts_local, 'cached', None)
+    if cached is None or t - cached[1] > 0.001:
+        cached = _ts_local.cached = (datetime.utcfromtimestamp(t).isoformat(), t)
+    return cached[0]
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """FileHandler that writes through a large buffer instead of flushing every record"""
+
+    def __init__(self, filename: str, mode: str = 'a', encoding: str = None,
+                 delay: bool = False, buffer_size: int = 65536):
+        self.buffer_size = buffer_size
+        super().__init__(filename, mode, encoding, delay)
+
+    def _open(self):
+        """Open the log file with an explicit write buffer"""
+        return open(self.baseFilename, self.mode, buffering=self.buffer_size,
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record: logging.LogRecord):
+        """Write the record, flushing only for errors so crash data reaches disk"""
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+def start_periodic_flush(handler: logging.Handler, interval: float = 0.5) -> threading.Thread:
+    """Flush a buffered handler (and the handler it wraps) every interval seconds"""
+    def _flush_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                handler.flush()
+                target = getattr(handler, 'target', None)
+                if target is not None:
+                    target.flush()
+            except Exception:
+                pass  # Never let a failed flush kill the flusher
+
+    flusher = threading.Thread(target=_flush_loop, name='log-flush', daemon=True)
+    flusher.start()
+    return flusher
+
+
+def start_queue_logging(*handlers: logging.Handler, level: int = logging.INFO,
+                        fmt: str = LOG_FORMAT) -> logging.handlers.QueueListener:
+    """Route root logging through a queue drained by a background listener"""
+    formatter = logging.Formatter(fmt)
+    for handler in handlers:
+        # MemoryHandler delegates formatting to the handler it wraps
+        target = getattr(handler, 'target', None) or handler
+        if target.formatter is None:
+            target.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+
+    # The queue side only merges args into the message; the listener
+    # thread applies the full format and does the actual writes
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    # Drain pending records before logging.shutdown() closes the handlers
+    atexit.register(listener.stop)
+
+    logging.basicConfig(level=level, handlers=[queue_handler])
+
+    return listener
@@ -5,30 +5,52 @@ Lightweight, memory-efficient, and production-ready
 """
 
 import logging
+import logging.handlers
 import json
 import time
 import psutil
 import threading
-from datetime import datetime
 from typing import Dict, Any
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from config import config
 from monitoring.metrics_collector import MetricsCollector
+from log_utils import BufferedFileHandler, now_iso, start_periodic_flush, start_queue_logging
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, config.get('log_level', 'INFO')),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/opt/smart-incident-predictor/logs/application.log'),
-        logging.StreamHandler()
-    ]
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+# Configure logging (records are queued; a listener thread does the file I/O)
+file_handler = logging.handlers.MemoryHandler(
+    capacity=512,
+    flushLevel=logging.ERROR,  # Errors reach disk immediately
+    target=BufferedFileHandler('/opt/smart-incident-predictor/logs/application.log')
+)
+log_listener = start_queue_logging(
+    file_handler,
+    logging.StreamHandler(),
+    level=getattr(logging, config.get('log_level', 'INFO'))
 )
+start_periodic_flush(file_handler, interval=0.5)
 
 logger = logging.getLogger(__name__)
 
+# Configuration is fixed for the life of the process; resolve the keys the
+# handlers need once instead of walking the config dict on every request
+_LOG_ALL = config.get('development.log_all_requests', False)
+_ENV = config.environment.name
+_APP_PORT = config.get('app.port', 5000)
+_APP_WORKERS = config.get('app.workers')
+_MAX_MEM = config.get('resources.max_memory_mb')
+_MAX_CPU = config.get('resources.max_cpu_percent')
+_ML_ALGORITHM = config.get('ml.model.algorithm')
+_ML_POLL = config.get('ml.inference.polling_interval')
+_ML_FEATURE_LIMIT = config.get('ml.inference.feature_limit')
+_ENABLED = tuple(config.get_enabled_features())
+
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app)
 
@@ -36,21 +58,57 @@ app.wsgi_app = ProxyFix(app.wsgi_app)
 metrics_collector = MetricsCollector()
 metrics_lock = threading.Lock()
 
+# This process, created once; psutil.Process() re-reads /proc on construction
+_self_proc = psutil.Process()
+
 class ResourceMonitor:
     """Monitor resource usage to stay within t2.micro limits"""
     
-    def __init__(self):
+    def __init__(self, sample_interval: float = 1.0):
         self.max_memory_mb = config.get('resources.max_memory_mb', 900)
         self.max_cpu_percent = config.get('resources.max_cpu_percent', 80)
+        self.sample_interval = sample_interval
         
-    def check_resources(self) -> Dict[str, Any]:
-        """Check if resources are within limits"""
+        # Latest (memory_mb, memory_percent, cpu_percent), swapped in as one tuple
+        memory = psutil.virtual_memory()
+        psutil.cpu_percent(interval=None)  # Prime the non-blocking CPU counter
+        self._latest = (memory.used / (1024 * 1024), memory.percent, 0.0)
+        self.process_rss_mb = _self_proc.memory_info().rss / (1024 * 1024)
+        
+        # (sample, status) for the last evaluated sample; the status only
+        # changes when the sampler publishes, so every request in between
+        # shares one dict (callers must treat it as read-only)
+        self._status_cache = (None, None)
+        
+        sampler = threading.Thread(target=self._sample_loop, name='resource-sampler', daemon=True)
+        sampler.start()
+    
+    def _sample_loop(self):
+        """Refresh the cached readings; the blocking CPU interval only stalls this thread"""
+        while True:
+            try:
+                cpu_percent = psutil.cpu_percent(interval=self.sample_interval)
+                memory = psutil.virtual_memory()
+                self._latest = (memory.used / (1024 * 1024), memory.percent, cpu_percent)
+                self.process_rss_mb = _self_proc.memory_info().rss / (1024 * 1024)
+            except Exception as e:
+                logger.error(f"Resource sampling failed: {str(e)}")
+                time.sleep(self.sample_interval)
+    
+    def check_resources(self, fresh: bool = False) -> Dict[str, Any]:
+        """Check if resources are within limits (cached unless fresh is requested)"""
         try:
-            memory = psutil.virtual_memory()
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            
-            memory_mb = memory.used / (1024 * 1024)
-            memory_percent = memory.percent
+            if fresh:
+                memory = psutil.virtual_memory()
+                cpu_percent = psutil.cpu_percent(interval=0.1)
+                memory_mb = memory.used / (1024 * 1024)
+                memory_percent = memory.percent
+            else:
+                latest = self._latest
+                cached_sample, cached_status = self._status_cache
+                if latest is cached_sample:
+                    return cached_status
+                memory_mb, memory_percent, cpu_percent = latest
             
             status = {
                 'memory_mb': memory_mb,
@@ -72,6 +130,9 @@ class ResourceMonitor:
             if cpu_percent > self.max_cpu_percent:
                 status['warnings'].append(f"CPU usage {cpu_percent:.1f}% exceeds limit {self.max_cpu_percent}%")
             
+            if not fresh:
+                self._status_cache = (latest, status)
+            
             return status
             
         except Exception as e:
@@ -88,13 +149,13 @@ resource_monitor = ResourceMonitor()
 @app.before_request
 def before_request():
     """Log incoming requests"""
-    if config.get('development.log_all_requests', False):
+    if _LOG_ALL:
         logger.info(f"Request: {request.method} {request.path}")
 
 @app.after_request
 def after_request(response):
     """Log responses and check resources"""
-    if config.get('development.log_all_requests', False):
+    if _LOG_ALL:
         logger.info(f"Response: {response.status_code}")
     
     # Check resources after each request
@@ -103,18 +164,52 @@ def after_request(response):
     
     return response
 
+def _static_json(payload: Dict[str, Any]) -> bytes:
+    """Serialize a payload the way jsonify would (sorted keys, compact)"""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+
+def _json_response(payload: Dict[str, Any], status: int = 200) -> Response:
+    """Encode a payload straight into a response, skipping jsonify's provider dispatch"""
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':')).encode()
+    return app.response_class(body, status=status, mimetype='application/json')
+
+# Index body with only the timestamp left to fill in per request
+_INDEX_TEMPLATE = _static_json({
+    'service': 'Smart Incident Predictor',
+    'version': '1.0.0-t2micro',
+    'status': 'running',
+    'timestamp': '__TIMESTAMP__',
+    'environment': _ENV,
+    'message': 'Lightweight predictive monitoring for AWS t2.micro'
+}).replace(b'%', b'%%').replace(b'"__TIMESTAMP__"', b'"%s"')
+
+# The safe config subset only changes on restart
+_CONFIG_BYTES = _static_json({
+    'environment': _ENV,
+    'ml': {
+        'algorithm': _ML_ALGORITHM,
+        'polling_interval': _ML_POLL,
+        'feature_limit': _ML_FEATURE_LIMIT,
+        'enabled_features': _ENABLED
+    },
+    'resources': {
+        'max_memory_mb': _MAX_MEM,
+        'max_cpu_percent': _MAX_CPU
+    },
+    'app': {
+        'port': _APP_PORT,
+        'workers': _APP_WORKERS
+    }
+})
+
 @app.route('/')
 def index():
     """Main endpoint - lightweight response"""
     try:
-        return jsonify({
-            'service': 'Smart Incident Predictor',
-            'version': '1.0.0-t2micro',
-            'status': 'running',
-            'timestamp': datetime.utcnow().isoformat(),
-            'environment': config.environment,
-            'message': 'Lightweight predictive monitoring for AWS t2.micro'
-        })
+        return Response(_INDEX_TEMPLATE % now_iso().encode(), mimetype='application/json')
     except Exception as e:
         logger.error(f"Index endpoint error: {str(e)}")
         return jsonify({'error': 'Service unavailable'}), 500
@@ -138,7 +233,7 @@ def health_check():
         
         response_data = {
             'status': app_status,
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now_iso(),
             'uptime': time.time() - metrics_collector.start_time,
             'checks': {
                 'application': 'ok' if app_healthy else 'critical',
@@ -154,20 +249,23 @@ def health_check():
         }
         
         status_code = 200 if overall_healthy else 503
-        return jsonify(response_data), status_code
+        return _json_response(response_data, status_code)
         
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return jsonify({
             'status': 'unhealthy',
             'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': now_iso()
         }), 503
 
 @app.route('/api/metrics')
 def get_metrics():
     """Get system and application metrics"""
     try:
+        # ?fresh=1 takes blocking CPU samples instead of the cached readings
+        fresh = request.args.get('fresh') == '1'
+        
         # Check if safe to collect metrics
         if not resource_monitor.is_safe_to_proceed():
             return jsonify({
@@ -175,24 +273,24 @@ def get_metrics():
             }), 503
         
         # Collect system metrics (lightweight version)
-        system_metrics = _collect_lightweight_metrics()
+        system_metrics = _collect_lightweight_metrics(fresh)
         
         # Collect application metrics
         app_metrics = {
             'uptime_seconds': time.time() - metrics_collector.start_time,
             'requests_per_minute': _estimate_rpm(),
             'error_rate': _estimate_error_rate(),
-            'memory_usage_mb': psutil.Process().memory_info().rss / (1024 * 1024)
+            'memory_usage_mb': resource_monitor.process_rss_mb
         }
         
         response_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now_iso(),
             'system': system_metrics,
             'application': app_metrics,
-            'resource_status': resource_monitor.check_resources()
+            'resource_status': resource_monitor.check_resources(fresh)
         }
         
-        return jsonify(response_data)
+        return _json_response(response_data)
         
     except Exception as e:
         logger.error(f"Metrics collection failed: {str(e)}")
@@ -209,26 +307,26 @@ def get_status():
         ml_status = _check_ml_service_status()
         
         response_data = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'environment': config.environment,
+            'timestamp': now_iso(),
+            'environment': _ENV,
             'services': {
                 'api': {
                     'status': 'running',
-                    'port': config.get('app.port', 5000),
-                    'memory_mb': psutil.Process().memory_info().rss / (1024 * 1024)
+                    'port': _APP_PORT,
+                    'memory_mb': resource_monitor.process_rss_mb
                 },
                 'ml_detector': ml_status
             },
             'resources': resource_status,
             'configuration': {
-                'max_memory_mb': config.get('resources.max_memory_mb'),
-                'max_cpu_percent': config.get('resources.max_cpu_percent'),
-                'ml_polling_interval': config.get('ml.inference.polling_interval'),
-                'enabled_features': config.get_enabled_features()[:5]  # Show first 5
+                'max_memory_mb': _MAX_MEM,
+                'max_cpu_percent': _MAX_CPU,
+                'ml_polling_interval': _ML_POLL,
+                'enabled_features': _ENABLED[:5]  # Show first 5
             }
         }
         
-        return jsonify(response_data)
+        return _json_response(response_data)
         
     except Exception as e:
         logger.error(f"Status check failed: {str(e)}")
@@ -237,36 +335,16 @@ def get_status():
 @app.route('/api/config')
 def get_config():
     """Get current configuration (safe subset)"""
-    try:
-        safe_config = {
-            'environment': config.environment,
-            'ml': {
-                'algorithm': config.get('ml.model.algorithm'),
-                'polling_interval': config.get('ml.inference.polling_interval'),
-                'feature_limit': config.get('ml.inference.feature_limit'),
-                'enabled_features': config.get_enabled_features()
-            },
-            'resources': {
-                'max_memory_mb': config.get('resources.max_memory_mb'),
-                'max_cpu_percent': config.get('resources.max_cpu_percent')
-            },
-            'app': {
-                'port': config.get('app.port'),
-                'workers': config.get('app.workers')
-            }
-        }
-        
-        return jsonify(safe_config)
-        
-    except Exception as e:
-        logger.error(f"Config endpoint error: {str(e)}")
-        return jsonify({'error': 'Failed to get configuration'}), 500
+    return Response(_CONFIG_BYTES, mimetype='application/json')
 
-def _collect_lightweight_metrics() -> Dict[str, Any]:
+def _collect_lightweight_metrics(fresh: bool = False) -> Dict[str, Any]:
     """Collect essential metrics with minimal resource usage"""
     try:
-        # CPU metrics
-        cpu_percent = psutil.cpu_percent(interval=0.5)
+        # CPU metrics (the sampler thread's reading unless a fresh one is asked for)
+        if fresh:
+            cpu_percent = psutil.cpu_percent(interval=0.5)
+        else:
+            cpu_percent = resource_monitor._latest[2]
         
         # Memory metrics
         memory = psutil.virtual_memory()
@@ -301,21 +379,46 @@ def _estimate_error_rate() -> float:
     # This would be implemented with proper error tracking in production
     return 1.5  # Placeholder
 
+# Last known ML detector PID and when the process table was last scanned
+_ml_pid_cache = {'pid': None, 'scanned': 0.0}
+_ML_RESCAN_INTERVAL = 30.0
+
+def _ml_process_status(proc: psutil.Process) -> Dict[str, Any]:
+    """Status payload for a running ML detector process"""
+    return {
+        'status': 'running',
+        'pid': proc.pid,
+        'memory_mb': proc.memory_info().rss / (1024 * 1024)
+    }
+
 def _check_ml_service_status() -> Dict[str, Any]:
     """Check if ML service is running"""
     try:
-        # Check if ML service process is running
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+        # Re-verify the cached PID first; PIDs can be reused, so check cmdline too
+        pid = _ml_pid_cache['pid']
+        if pid is not None:
             try:
-                cmdline = ' '.join(proc.info['cmdline'] or [])
-                if 'anomaly_detector.py' in cmdline:
-                    return {
-                        'status': 'running',
-                        'pid': proc.info['pid'],
-                        'memory_mb': proc.memory_info().rss / (1024 * 1024)
-                    }
+                proc = psutil.Process(pid)
+                if 'anomaly_detector.py' in ' '.join(proc.cmdline()):
+                    return _ml_process_status(proc)
             except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+                pass
+            _ml_pid_cache['pid'] = None
+        
+        # Only walk the process table once per rescan interval
+        now = time.monotonic()
+        if now - _ml_pid_cache['scanned'] >= _ML_RESCAN_INTERVAL:
+            _ml_pid_cache['scanned'] = now
+            
+            # Check if ML service process is running
+            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+                try:
+                    cmdline = ' '.join(proc.info['cmdline'] or [])
+                    if 'anomaly_detector.py' in cmdline:
+                        _ml_pid_cache['pid'] = proc.info['pid']
+                        return _ml_process_status(proc)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
         
         return {
             'status': 'not_running',
@@ -338,7 +441,7 @@ def create_app():
         logger.error("Configuration validation failed")
         raise RuntimeError("Invalid configuration for t2.micro deployment")
     
-    logger.info(f"Application configured for {config.environment} environment")
+    logger.info(f"Application configured for {_ENV} environment")
     logger.info(f"Memory limit: {config.get('resources.max_memory_mb')}MB")
     logger.info(f"ML polling interval: {config.get('ml.inference.polling_interval')}s")
     
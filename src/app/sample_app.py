@@ -7,192 +7,281 @@ Simulates a production-like web application with various log patterns
 import time
 import random
 import logging
+import logging.handlers
+import threading
 import psutil
 import json
-from datetime import datetime
-from flask import Flask, jsonify, request
+import numpy as np
+from functools import partial
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from log_generator import LogGenerator
+from log_utils import BufferedFileHandler, now_iso, start_periodic_flush, start_queue_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/opt/smart-incident-predictor/logs/application.log'),
-        logging.StreamHandler()
-    ]
+try:
+    import orjson
+except ImportError:  # Fall back to Flask's stdlib provider
+    orjson = None
+
+# Configure logging (records are queued; a listener thread does the file I/O)
+file_handler = logging.handlers.MemoryHandler(
+    capacity=1024,
+    flushLevel=logging.ERROR,  # Errors reach disk immediately
+    target=BufferedFileHandler('/opt/smart-incident-predictor/logs/application.log',
+                               delay=True, buffer_size=131072),
+    flushOnClose=True
+)
+log_listener = start_queue_logging(
+    file_handler,
+    logging.StreamHandler(),
+    level=logging.INFO
 )
+start_periodic_flush(file_handler, interval=2.0)
 
 logger = logging.getLogger(__name__)
 
+# Per-thread batches of uniforms; request threads never contend on one PRNG
+_rand_local = threading.local()
+_RAND_BATCH = 4096
+
+def urand() -> float:
+    """Next uniform in [0, 1) from this thread's pre-drawn batch"""
+    tl = _rand_local
+    i = getattr(tl, 'i', _RAND_BATCH)
+    if i >= _RAND_BATCH:
+        if not hasattr(tl, 'rng'):
+            tl.rng = np.random.default_rng()
+        tl.buf = tl.rng.random(_RAND_BATCH).tolist()
+        i = 0
+    tl.i = i + 1
+    return tl.buf[i]
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson"""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize obj, keeping Flask's key sorting and fallback encoders"""
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON document"""
+        return orjson.loads(s)
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 log_generator = LogGenerator()
 
+# Log calls for each route outcome, with the static arguments bound once
+_log_index_ok = partial(log_generator.generate_normal_log, '/', 'GET', 200)
+_log_users_ok = partial(log_generator.generate_normal_log, '/api/users', 'GET', 200)
+_log_users_slow = partial(log_generator.generate_warning_log, '/api/users', 'GET', 'SlowQuery')
+_log_users_db_error = partial(log_generator.generate_error_log, '/api/users', 'GET',
+                              'DatabaseConnectionError', 'Failed to connect to database')
+_log_orders_ok = partial(log_generator.generate_normal_log, '/api/orders', 'POST', 201)
+_log_orders_invalid = partial(log_generator.generate_error_log, '/api/orders', 'POST',
+                              'ValidationError', 'Invalid order data')
+_log_orders_payment_error = partial(log_generator.generate_error_log, '/api/orders', 'POST',
+                                    'PaymentError', 'Payment processing failed')
+_log_orders_unexpected = partial(log_generator.generate_error_log, '/api/orders', 'POST',
+                                 'UnexpectedError')
+_log_background_warning = partial(log_generator.generate_warning_log, '/background/task',
+                                  'INTERNAL', 'ResourceWarning')
+
+# Simulated application metrics generated per NumPy call
+_SIM_BATCH = 64
+
+class SystemSnapshot:
+    """One reading of the system counters, shared by every request until the next"""
+    __slots__ = ('cpu', 'mem', 'disk', 'load', 'tx', 'rx', 'ts')
+    
+    def __init__(self):
+        network = psutil.net_io_counters()
+        self.cpu = psutil.cpu_percent(interval=None)
+        self.mem = psutil.virtual_memory().percent
+        self.disk = psutil.disk_usage('/').percent
+        self.load = psutil.getloadavg()[0] if hasattr(psutil, 'getloadavg') else 0
+        self.tx = network.bytes_sent
+        self.rx = network.bytes_recv
+        self.ts = time.monotonic()
+
 class ApplicationMetrics:
     """Collect application and system metrics"""
     
-    def __init__(self):
+    def __init__(self, sample_interval: float = 1.0):
         self.start_time = time.time()
+        self.sample_interval = sample_interval
+        
+        # Prime the counter so non-blocking cpu_percent() has a baseline
+        psutil.cpu_percent(interval=None)
+        self._snapshot = SystemSnapshot()
+        
+        self._rng = np.random.default_rng()
+        self._refill_simulated()
+        
+        sampler = threading.Thread(target=self._sample_loop, name='system-sampler', daemon=True)
+        sampler.start()
+    
+    def _sample_loop(self):
+        """Replace the shared snapshot every sample_interval seconds"""
+        while True:
+            time.sleep(self.sample_interval)
+            try:
+                self._snapshot = SystemSnapshot()
+            except Exception as e:
+                logger.error("System sampling failed: %s", e)
         
     def get_system_metrics(self):
-        """Get system-level metrics"""
+        """Get system-level metrics (from the latest background snapshot)"""
+        snap = self._snapshot
         return {
-            'cpu_percent': psutil.cpu_percent(interval=1),
-            'memory_percent': psutil.virtual_memory().percent,
-            'disk_percent': psutil.disk_usage('/').percent,
-            'load_average': psutil.getloadavg()[0] if hasattr(psutil, 'getloadavg') else 0,
+            'cpu_percent': snap.cpu,
+            'memory_percent': snap.mem,
+            'disk_percent': snap.disk,
+            'load_average': snap.load,
             'network_io': {
-                'bytes_sent': psutil.net_io_counters().bytes_sent,
-                'bytes_recv': psutil.net_io_counters().bytes_recv
+                'bytes_sent': snap.tx,
+                'bytes_recv': snap.rx
             }
         }
     
     def get_application_metrics(self):
         """Get application-level metrics"""
         uptime = time.time() - self.start_time
+        error_rate, response_time_avg = self._next_simulated()
         return {
             'uptime_seconds': uptime,
             'requests_per_minute': self._calculate_rpm(),
-            'error_rate': self._calculate_error_rate(),
-            'response_time_avg': self._calculate_avg_response_time()
+            'error_rate': error_rate,
+            'response_time_avg': response_time_avg
         }
     
     def _calculate_rpm(self):
         """Calculate requests per minute (simulated)"""
         return random.randint(50, 200)
     
-    def _calculate_error_rate(self):
-        """Calculate error rate (simulated)"""
-        # Simulate occasional error spikes
-        if random.random() < 0.05:  # 5% chance of error spike
-            return random.uniform(10, 25)
-        return random.uniform(0.5, 3.0)
+    def _refill_simulated(self):
+        """Generate a batch of simulated (error_rate, response_time_avg) pairs"""
+        rng, n = self._rng, _SIM_BATCH
+        
+        # Simulate occasional error spikes (5% chance)
+        error_rate = np.where(rng.random(n) < 0.05,
+                              rng.uniform(10, 25, n), rng.uniform(0.5, 3.0, n))
+        
+        # Simulate occasional latency spikes (3% chance)
+        response_time = np.where(rng.random(n) < 0.03,
+                                 rng.uniform(800, 2000, n), rng.uniform(100, 400, n))
+        
+        self._sim_batch = np.column_stack((error_rate, response_time)).tolist()
+        self._sim_pos = 0
     
-    def _calculate_avg_response_time(self):
-        """Calculate average response time (simulated)"""
-        # Simulate occasional latency spikes
-        if random.random() < 0.03:  # 3% chance of latency spike
-            return random.uniform(800, 2000)
-        return random.uniform(100, 400)
+    def _next_simulated(self):
+        """Next pre-generated (error_rate, response_time_avg) pair"""
+        pos = self._sim_pos
+        if pos >= _SIM_BATCH:
+            self._refill_simulated()
+            pos = 0
+        self._sim_pos = pos + 1
+        return self._sim_batch[pos]
 
 metrics = ApplicationMetrics()
 
+def _json_template(payload) -> bytes:
+    """Encode a constant payload once, leaving a %s slot for its timestamp"""
+    body = app.json.dumps(dict(payload, timestamp='__TIMESTAMP__')).encode()
+    return body.replace(b'%', b'%%').replace(b'"__TIMESTAMP__"', b'"%s"')
+
+def _timestamped(template: bytes, status: int = 200) -> Response:
+    """Fill the current timestamp into a pre-encoded template"""
+    return Response(template % now_iso().encode(), status=status, mimetype='application/json')
+
+# Success bodies that only differ by timestamp
+_INDEX_BODY = _json_template({
+    'message': 'Smart Incident Predictor - Sample Application',
+    'status': 'healthy'
+})
+_USERS_BODY = _json_template({
+    'users': [
+        {'id': 1, 'name': 'John Doe'},
+        {'id': 2, 'name': 'Jane Smith'}
+    ]
+})
+_HEALTHY_BODY = _json_template({
+    'status': 'healthy',
+    'checks': {'cpu': 'ok', 'memory': 'ok', 'disk': 'ok'}
+})
+
 @app.route('/')
 def index():
     """Main endpoint"""
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     # Simulate processing time
-    time.sleep(random.uniform(0.01, 0.1))
+    time.sleep(0.01 + 0.09 * urand())
     
     # Generate normal log
-    log_generator.generate_normal_log(
-        endpoint='/',
-        method='GET',
-        status_code=200,
-        response_time=(time.time() - start_time) * 1000
-    )
+    _log_index_ok((time.monotonic_ns() - start_ns) / 1e6)
     
-    return jsonify({
-        'message': 'Smart Incident Predictor - Sample Application',
-        'timestamp': datetime.utcnow().isoformat(),
-        'status': 'healthy'
-    })
+    return _timestamped(_INDEX_BODY)
 
 @app.route('/api/users')
 def get_users():
     """Users endpoint - can generate various response patterns"""
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     # Simulate different scenarios
-    scenario = random.random()
+    scenario = urand()
     
     if scenario < 0.02:  # 2% chance of server error
-        log_generator.generate_error_log(
-            endpoint='/api/users',
-            method='GET',
-            error_type='DatabaseConnectionError',
-            error_message='Failed to connect to database'
-        )
+        _log_users_db_error()
         return jsonify({'error': 'Internal server error'}), 500
     
     elif scenario < 0.05:  # 3% chance of slow response
-        time.sleep(random.uniform(1.0, 2.0))
-        log_generator.generate_warning_log(
-            endpoint='/api/users',
-            method='GET',
-            warning_type='SlowQuery',
-            response_time=(time.time() - start_time) * 1000
-        )
+        time.sleep(1.0 + 1.0 * urand())
+        _log_users_slow((time.monotonic_ns() - start_ns) / 1e6)
     else:
         # Normal response
-        time.sleep(random.uniform(0.05, 0.2))
-        log_generator.generate_normal_log(
-            endpoint='/api/users',
-            method='GET',
-            status_code=200,
-            response_time=(time.time() - start_time) * 1000
-        )
+        time.sleep(0.05 + 0.15 * urand())
+        _log_users_ok((time.monotonic_ns() - start_ns) / 1e6)
     
-    return jsonify({
-        'users': [
-            {'id': 1, 'name': 'John Doe'},
-            {'id': 2, 'name': 'Jane Smith'}
-        ],
-        'timestamp': datetime.utcnow().isoformat()
-    })
+    return _timestamped(_USERS_BODY)
 
 @app.route('/api/orders', methods=['POST'])
 def create_order():
     """Orders endpoint - POST request simulation"""
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
         # Simulate order processing
-        time.sleep(random.uniform(0.1, 0.3))
+        time.sleep(0.1 + 0.2 * urand())
         
         # Random failure scenarios
-        scenario = random.random()
+        scenario = urand()
         
         if scenario < 0.03:  # 3% chance of validation error
-            log_generator.generate_error_log(
-                endpoint='/api/orders',
-                method='POST',
-                error_type='ValidationError',
-                error_message='Invalid order data'
-            )
+            _log_orders_invalid()
             return jsonify({'error': 'Invalid order data'}), 400
         
         elif scenario < 0.05:  # 2% chance of payment processing error
-            log_generator.generate_error_log(
-                endpoint='/api/orders',
-                method='POST',
-                error_type='PaymentError',
-                error_message='Payment processing failed'
-            )
+            _log_orders_payment_error()
             return jsonify({'error': 'Payment failed'}), 502
         
         # Success case
-        log_generator.generate_normal_log(
-            endpoint='/api/orders',
-            method='POST',
-            status_code=201,
-            response_time=(time.time() - start_time) * 1000
-        )
+        _log_orders_ok((time.monotonic_ns() - start_ns) / 1e6)
         
         return jsonify({
             'order_id': random.randint(1000, 9999),
             'status': 'created',
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': now_iso()
         }), 201
         
     except Exception as e:
-        log_generator.generate_error_log(
-            endpoint='/api/orders',
-            method='POST',
-            error_type='UnexpectedError',
-            error_message=str(e)
-        )
+        _log_orders_unexpected(str(e))
         return jsonify({'error': 'Unexpected error occurred'}), 500
 
 @app.route('/api/metrics')
@@ -203,18 +292,18 @@ def get_metrics():
         app_metrics = metrics.get_application_metrics()
         
         # Log metrics collection
-        logger.info(f"Metrics collected - CPU: {system_metrics['cpu_percent']}%, "
-                   f"Memory: {system_metrics['memory_percent']}%, "
-                   f"Error Rate: {app_metrics['error_rate']}%")
+        logger.info("Metrics collected - CPU: %s%%, Memory: %s%%, Error Rate: %s%%",
+                    system_metrics['cpu_percent'], system_metrics['memory_percent'],
+                    app_metrics['error_rate'])
         
         return jsonify({
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now_iso(),
             'system': system_metrics,
             'application': app_metrics
         })
         
     except Exception as e:
-        logger.error(f"Failed to collect metrics: {str(e)}")
+        logger.error("Failed to collect metrics: %s", e)
         return jsonify({'error': 'Failed to collect metrics'}), 500
 
 @app.route('/health')
@@ -228,56 +317,60 @@ def health_check():
         memory_ok = system_metrics['memory_percent'] < 90
         disk_ok = system_metrics['disk_percent'] < 90
         
-        status = 'healthy' if all([cpu_ok, memory_ok, disk_ok]) else 'unhealthy'
-        http_status = 200 if status == 'healthy' else 503
+        if cpu_ok and memory_ok and disk_ok:
+            return _timestamped(_HEALTHY_BODY)
         
         return jsonify({
-            'status': status,
-            'timestamp': datetime.utcnow().isoformat(),
+            'status': 'unhealthy',
+            'timestamp': now_iso(),
             'checks': {
                 'cpu': 'ok' if cpu_ok else 'critical',
                 'memory': 'ok' if memory_ok else 'critical',
                 'disk': 'ok' if disk_ok else 'critical'
             }
-        }), http_status
+        }), 503
         
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed: %s", e)
         return jsonify({
             'status': 'unhealthy',
             'error': str(e)
         }), 503
 
-def simulate_background_activity():
+# Set to stop the background activity loop
+background_stop = threading.Event()
+
+def simulate_background_activity(stop: threading.Event = background_stop):
     """Simulate background application activity"""
-    while True:
+    # Event.wait sleeps like time.sleep but returns as soon as stop is set
+    while not stop.is_set():
         try:
             # Generate random background logs
-            scenario = random.random()
+            scenario = urand()
             
             if scenario < 0.1:  # 10% chance of background task log
                 log_generator.generate_background_log()
             
             elif scenario < 0.12:  # 2% chance of warning
-                log_generator.generate_warning_log(
-                    endpoint='/background/task',
-                    method='INTERNAL',
-                    warning_type='ResourceWarning',
-                    response_time=random.uniform(500, 1500)
-                )
+                _log_background_warning(500 + 1000 * urand())
             
-            time.sleep(random.uniform(5, 15))
+            stop.wait(5 + 10 * urand())
             
         except Exception as e:
-            logger.error(f"Background activity error: {str(e)}")
-            time.sleep(5)
+            logger.error("Background activity error: %s", e)
+            stop.wait(5)
+
+def start_background_activity() -> threading.Thread:
+    """Start the background activity thread"""
+    background_stop.clear()
+    background_thread = threading.Thread(target=simulate_background_activity,
+                                         name='background-activity', daemon=True)
+    background_thread.start()
+    return background_thread
 
 if __name__ == '__main__':
-    import threading
-    
     # Start background activity thread
-    background_thread = threading.Thread(target=simulate_background_activity, daemon=True)
-    background_thread.start()
+    start_background_activity()
     
     logger.info("Starting Smart Incident Predictor Sample Application")
     
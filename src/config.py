@@ -5,15 +5,40 @@ Optimized for AWS t2.micro constraints
 """
 
 import os
+import re
 import yaml
+import pickle
 import logging
-from typing import Dict, Any, Optional
-from dataclasses import dataclass
+import functools
+from enum import IntEnum
+from typing import Dict, Any, NamedTuple, Optional
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class AppConfig:
+# libyaml's C parser when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# Numeric shapes for environment overrides, checked without raising ValueError
+_INT_RE = re.compile(r'[-+]?\d+$')
+_FLOAT_RE = re.compile(r'[-+]?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?$')
+
+class Environment(IntEnum):
+    """Deployment environment"""
+    LOCAL = 0
+    AWS_EC2 = 1
+    DOCKER = 2  # Set by Dockerfile.t2micro and docker-compose.t2micro.yml
+
+@functools.lru_cache(maxsize=1)
+def _detect_env() -> Environment:
+    """Auto-detect the environment (the hypervisor marker is stat'ed once per process)"""
+    if os.path.exists('/sys/hypervisor/uuid'):
+        return Environment.AWS_EC2
+    return Environment.LOCAL
+
+class AppConfig(NamedTuple):
     """Application configuration"""
     host: str = "0.0.0.0"
     port: int = 5000
@@ -22,8 +47,7 @@ class AppConfig:
     debug: bool = False
     log_level: str = "INFO"
 
-@dataclass
-class MLConfig:
+class MLConfig(NamedTuple):
     """ML service configuration"""
     algorithm: str = "IsolationForest"
     contamination: float = 0.1
@@ -37,10 +61,9 @@ class MLConfig:
     memory_threshold_mb: int = 512
     training_mode: str = "startup"
     min_samples: int = 50
-    max_samples: int = 500
+    max_training_samples: int = 500
 
-@dataclass
-class ResourceConfig:
+class ResourceConfig(NamedTuple):
     """Resource limits configuration"""
     max_memory_mb: int = 900
     max_cpu_percent: int = 80
@@ -53,14 +76,18 @@ class ConfigManager:
     def __init__(self, config_path: str = "config.yaml"):
         self.config_path = config_path
         self._config = self._load_config()
+        self._flat = self._build_flat_config(self._config)
         self.environment = self._get_environment()
         
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from YAML file"""
         try:
             if os.path.exists(self.config_path):
-                with open(self.config_path, 'r') as f:
-                    config = yaml.safe_load(f)
+                config = self._load_cached_config()
+                if config is None:
+                    with open(self.config_path, 'r') as f:
+                        config = yaml.load(f, Loader=_YamlLoader)
+                    self._save_cached_config(config)
                 logger.info(f"Configuration loaded from {self.config_path}")
                 return config
             else:
@@ -70,18 +97,50 @@ class ConfigManager:
             logger.error(f"Failed to load config: {str(e)}")
             return self._get_default_config()
     
-    def _get_environment(self) -> str:
+    def _config_stamp(self) -> tuple:
+        """Identify the current YAML contents by mtime and size"""
+        st = os.stat(self.config_path)
+        return (st.st_mtime_ns, st.st_size)
+    
+    def _load_cached_config(self) -> Optional[Dict[str, Any]]:
+        """Return the pickled config if it was parsed from the current YAML"""
+        try:
+            with open(f"{self.config_path}.pkl", 'rb') as f:
+                stamp, config = pickle.load(f)
+            if stamp == self._config_stamp():
+                return config
+        except Exception:
+            pass  # Missing or stale cache; parse the YAML instead
+        return None
+    
+    def _save_cached_config(self, config: Dict[str, Any]):
+        """Pickle the parsed config next to the YAML (skipped on read-only installs)"""
+        cache_path = f"{self.config_path}.pkl"
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((self._config_stamp(), config), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.debug(f"Config cache not written: {str(e)}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    
+    def _get_environment(self) -> Environment:
         """Get current environment"""
         env = os.getenv('ENVIRONMENT', '').upper()
-        if not env:
-            # Auto-detect environment
-            if os.path.exists('/sys/hypervisor/uuid'):
-                env = 'AWS_EC2'
-            else:
-                env = 'LOCAL'
+        if env:
+            environment = Environment.__members__.get(env)
+            if environment is None:
+                logger.warning(f"Unknown environment {env}, falling back to LOCAL")
+                environment = Environment.LOCAL
+        else:
+            environment = _detect_env()
         
-        logger.info(f"Environment detected: {env}")
-        return env
+        logger.info(f"Environment detected: {environment.name}")
+        return environment
     
     def _get_default_config(self) -> Dict[str, Any]:
         """Get default configuration"""
@@ -123,47 +182,44 @@ class ConfigManager:
             }
         }
     
+    def _build_flat_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten config to dotted keys, with environment overrides applied once"""
+        flat = {}
+        
+        def _flatten(node: Dict[str, Any], prefix: str):
+            for k, v in node.items():
+                dotted = f"{prefix}{k}"
+                flat[dotted] = v  # Intermediate sections stay addressable too
+                if isinstance(v, dict):
+                    _flatten(v, f"{dotted}.")
+        
+        if isinstance(config, dict):
+            _flatten(config, '')
+        
+        # Override with environment variables (only for keys the config defines)
+        for key in flat:
+            env_value = os.getenv(key.upper().replace('.', '_'))
+            if env_value is not None:
+                flat[key] = self._convert_env_value(env_value)
+        
+        return flat
+    
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value by key (supports dot notation)"""
-        try:
-            keys = key.split('.')
-            value = self._config
-            
-            for k in keys:
-                if isinstance(value, dict) and k in value:
-                    value = value[k]
-                else:
-                    return default
-            
-            # Override with environment variables
-            env_key = key.upper().replace('.', '_')
-            env_value = os.getenv(env_key)
-            if env_value is not None:
-                return self._convert_env_value(env_value)
-            
-            return value
-            
-        except Exception as e:
-            logger.error(f"Failed to get config key {key}: {str(e)}")
-            return default
+        return self._flat.get(key, default)
     
     def _convert_env_value(self, value: str) -> Any:
         """Convert environment variable to appropriate type"""
         # Try boolean
-        if value.lower() in ('true', 'false'):
-            return value.lower() == 'true'
+        lowered = value.lower()
+        if lowered in ('true', 'false'):
+            return lowered == 'true'
         
-        # Try integer
-        try:
+        # Try integer, then float
+        if _INT_RE.match(value):
             return int(value)
-        except ValueError:
-            pass
-        
-        # Try float
-        try:
+        if _FLOAT_RE.match(value):
             return float(value)
-        except ValueError:
-            pass
         
         # Return as string
         return value
@@ -194,7 +250,7 @@ class ConfigManager:
             memory_threshold_mb=self.get('ml.inference.memory_threshold_mb', 512),
             training_mode=self.get('ml.training.mode', 'startup'),
             min_samples=self.get('ml.training.min_samples', 50),
-            max_samples=self.get('ml.training.max_samples', 500)
+            max_training_samples=self.get('ml.training.max_samples', 500)
         )
     
     def get_resource_config(self) -> ResourceConfig:
@@ -208,11 +264,11 @@ class ConfigManager:
     
     def is_aws_ec2(self) -> bool:
         """Check if running on AWS EC2"""
-        return self.environment == 'AWS_EC2'
+        return self.environment is Environment.AWS_EC2
     
     def is_local(self) -> bool:
         """Check if running locally"""
-        return self.environment == 'LOCAL'
+        return self.environment is Environment.LOCAL
     
     def get_enabled_features(self) -> list:
         """Get list of enabled ML features"""
@@ -227,31 +283,28 @@ class ConfigManager:
     
     def validate_config(self) -> bool:
         """Validate configuration for t2.micro constraints"""
-        try:
-            # Check memory limits
-            max_memory = self.get('resources.max_memory_mb', 900)
-            if max_memory > 900:
-                logger.error(f"Memory limit {max_memory}MB exceeds t2.micro recommendation of 900MB")
-                return False
-            
-            # Check ML configuration
-            n_estimators = self.get('ml.model.n_estimators', 50)
-            if n_estimators > 100:
-                logger.error(f"Too many estimators {n_estimators} for t2.micro, recommend <= 50")
-                return False
-            
-            # Check polling intervals
-            polling_interval = self.get('ml.inference.polling_interval', 60)
-            if polling_interval < 30:
-                logger.error(f"Polling interval {polling_interval}s too aggressive for t2.micro")
-                return False
-            
-            logger.info("Configuration validation passed")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Configuration validation failed: {str(e)}")
+        flat = self._flat
+        max_memory = flat.get('resources.max_memory_mb', 900)
+        n_estimators = flat.get('ml.model.n_estimators', 50)
+        polling_interval = flat.get('ml.inference.polling_interval', 60)
+        
+        # Check memory limits
+        if max_memory > 900:
+            logger.error(f"Memory limit {max_memory}MB exceeds t2.micro recommendation of 900MB")
+            return False
+        
+        # Check ML configuration
+        if n_estimators > 100:
+            logger.error(f"Too many estimators {n_estimators} for t2.micro, recommend <= 50")
             return False
+        
+        # Check polling intervals
+        if polling_interval < 30:
+            logger.error(f"Polling interval {polling_interval}s too aggressive for t2.micro")
+            return False
+        
+        logger.info("Configuration validation passed")
+        return True
 
 # Global configuration instance
 config = ConfigManager()
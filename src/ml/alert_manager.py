@@ -4,203 +4,443 @@ Alert Manager for Anomaly Detection
 Handles alert generation and notification delivery
 """
 
+import atexit
+import functools
+import hashlib
 import logging
 import json
+import os
+import queue
+import socket
+import string
+import threading
+import time
 import boto3
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+import numpy as np
+from botocore.config import Config
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
+from enum import IntEnum
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+_STOP = object()
+
+def _pretty_json(message: Dict) -> str:
+    """Serialize a notification body as indented JSON for human readers"""
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(message, indent=2)
+
+def _compact_json(message: Dict) -> str:
+    """Serialize a machine-read log event as compact JSON"""
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(message, separators=(',', ':'))
+
+class _OfflineClient:
+    """No-op stand-in for a boto3 client when AWS_OFFLINE=1"""
+    
+    class exceptions:
+        ResourceAlreadyExistsException = type('ResourceAlreadyExistsException', (Exception,), {})
+    
+    class _Paginator:
+        def paginate(self, **kwargs):
+            return []
+    
+    def get_paginator(self, operation_name: str):
+        return self._Paginator()
+    
+    def __getattr__(self, name: str):
+        return lambda **kwargs: {}
+
+_CLIENT_CONFIG = Config(retries={'mode': 'adaptive', 'max_attempts': 3}, tcp_keepalive=True)
+
+@functools.cache
+def _session() -> boto3.session.Session:
+    """One session, so credentials are resolved and service models loaded once"""
+    return boto3.session.Session()
+
+def _aws_client(service: str):
+    """Create a boto3 client, or the offline stand-in"""
+    if os.environ.get('AWS_OFFLINE') == '1':
+        return _OfflineClient()
+    return _session().client(service, config=_CLIENT_CONFIG)
+
+# Clients are built on first use and shared by every AlertManager in the process
+@functools.cache
+def _sns():
+    return _aws_client('sns')
+
+@functools.cache
+def _logs():
+    return _aws_client('logs')
+
+_RULE = '=' * 60
+
+_CONSOLE_TEMPLATE = string.Template(f"""
+{_RULE}
+🚨 SMART INCIDENT PREDICTOR ALERT 🚨
+{_RULE}
+Incident ID: $incident_id
+Risk Level: $risk_level
+Risk Score: $risk_score/100
+Timestamp: $timestamp
+
+DESCRIPTION:
+$description
+
+RESPONSIBLE METRICS:
+$responsible_metrics
+
+RECOMMENDATIONS:
+$recommendations
+
+{_RULE}
+""")
+
+# Embedded Metric Format: CloudWatch extracts AlertRiskScore (per RiskLevel) from the log line
+_EMF_METRICS = [{
+    'Namespace': 'Custom/ML',
+    'Dimensions': [['RiskLevel']],
+    'Metrics': [{'Name': 'AlertRiskScore', 'Unit': 'None'}]
+}]
+
+# (feature, flag above, responsible label, label scale, recommend above, urgent above,
+#  recommendations, urgent recommendations), walked once per alert in this order
+_METRIC_RULES = (
+    ('cpu_current', 80, 'CPU Usage ({:.1f}%)', 1, 70, 90,
+     ("Monitor CPU usage closely", "Consider scaling up if trend continues"),
+     ("Scale up CPU resources immediately", "Check for CPU-intensive processes")),
+    ('memory_current', 80, 'Memory Usage ({:.1f}%)', 1, 75, 90,
+     ("Monitor memory usage trends",),
+     ("Scale up memory resources immediately", "Check for memory leaks")),
+    ('log_error_ratio', 0.05, 'Error Rate ({:.1f}%)', 100, 0.05, 0.1,
+     ("Review recent error logs",),
+     ("Investigate recent deployments", "Check database connectivity")),
+    ('response_time_current', 1000, 'Response Time ({:.0f}ms)', 1, 1000, 2000,
+     ("Monitor application performance",),
+     ("Investigate performance bottlenecks", "Check external service dependencies")),
+    ('system_stress_score', 0.7, 'System Stress ({:.1f}%)', 100, float('inf'), float('inf'),
+     (), ())
+)
+
+# The rule features, read from the alert's feature dict once (fields in _METRIC_RULES order)
+FeatureView = namedtuple('FeatureView', 'cpu memory err_ratio response stress')
+_FEATURE_KEYS = tuple(rule[0] for rule in _METRIC_RULES)
+_FLAG_THRESHOLDS = np.array([rule[1] for rule in _METRIC_RULES], dtype=float)
+
+class RiskLevel(IntEnum):
+    """Alert risk level"""
+    LOW = 0
+    MEDIUM = 1
+    HIGH = 2
+
+# Per-level alert text, indexed by RiskLevel
+_EMOJI = ('ℹ️', '⚠️', '🚨')
+_SUBJECT = (
+    'INFO: Low Risk Anomaly Detected',
+    'WARNING: Medium Risk Anomaly Detected',
+    'CRITICAL: High Risk Incident Predicted'
+)
+_PRIORITY = ('MEDIUM', 'HIGH', 'CRITICAL')
+_PREDICTIONS = (
+    "Minor issues may affect user experience",
+    "Performance degradation likely within 15-30 minutes",
+    "System failure expected within 5-10 minutes"
+)
+
+class _BatchSender:
+    """Buffers entries and hands them to a send callable in batches from a daemon thread"""
+    
+    def __init__(self, name: str, send: Callable[[List[Dict]], None],
+                 max_batch: int, batch_interval: float = 2.0):
+        self.name = name
+        self.max_batch = max_batch
+        self.batch_interval = batch_interval
+        self._send = send
+        self._queue = queue.Queue()
+        
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        
+        # Send whatever is still buffered when the process exits
+        atexit.register(self.stop)
+    
+    def put(self, entry: Dict):
+        """Queue an entry for the next batch"""
+        self._queue.put(entry)
+    
+    def stop(self, timeout: float = 5.0):
+        """Flush buffered entries and stop the worker"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+    
+    def _run(self):
+        """Collect up to max_batch entries or batch_interval seconds, then send"""
+        stopping = False
+        while not stopping:
+            batch = []
+            entry = self._queue.get()
+            if entry is _STOP:
+                stopping = True
+            else:
+                batch.append(entry)
+            
+            deadline = time.monotonic() + self.batch_interval
+            while not stopping and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                else:
+                    batch.append(entry)
+            
+            if batch:
+                try:
+                    self._send(batch)
+                except Exception as e:
+                    logger.error("Failed to send %s batch of %d: %s", self.name, len(batch), e)
+
+@dataclass(frozen=True)
 class Alert:
     """Alert data structure"""
+    __slots__ = ('timestamp', 'risk_score', 'risk_level', 'description',
+                 'responsible_metrics', 'recommendations', 'incident_id')
+    
     timestamp: str
     risk_score: float
     risk_level: str
     description: str
-    responsible_metrics: List[str]
-    recommendations: List[str]
+    responsible_metrics: Tuple[str, ...]
+    recommendations: Tuple[str, ...]
     incident_id: str
 
 class AlertManager:
     """Manages alert generation and delivery"""
     
+    # Topic ARN discovered via list_topics, shared by every instance
+    _cached_topic_arn = None
+    _topic_arn_lock = threading.Lock()
+    
     def __init__(self):
-        self.sns_client = boto3.client('sns')
-        self.cloudwatch_client = boto3.client('cloudwatch')
-        
         # Alert configuration
         self.alert_config = {
             'sns_topic_arn': self._get_sns_topic_arn(),
             'min_alert_interval': 300,  # 5 minutes between same type alerts
-            'alert_cooldown': {},  # Track alert cooldowns
-            'incident_counter': 0
+            'alert_cooldown': {},  # Alert fingerprint -> monotonic time last sent
+            'incident_counter': 0,  # Restarts at 1 each UTC day
+            'log_group': os.environ.get('ALERT_LOG_GROUP', '/aws/ec2/smart-incident-predictor/ml-service'),
+            'log_stream': f"alerts-{socket.gethostname()}-{os.getpid()}"
         }
+        self._log_stream_ready = False
         
-        # Alert templates
-        self.alert_templates = {
-            'HIGH': {
-                'emoji': '🚨',
-                'subject': 'CRITICAL: High Risk Incident Predicted',
-                'priority': 'CRITICAL'
-            },
-            'MEDIUM': {
-                'emoji': '⚠️',
-                'subject': 'WARNING: Medium Risk Anomaly Detected',
-                'priority': 'HIGH'
-            },
-            'LOW': {
-                'emoji': 'ℹ️',
-                'subject': 'INFO: Low Risk Anomaly Detected',
-                'priority': 'MEDIUM'
-            }
-        }
+        # Persistence gating: notify only after this many consecutive
+        # detections at the same risk level (ALERT_MIN_PERSISTENCE)
+        self._kappa = int(os.environ.get('ALERT_MIN_PERSISTENCE', 2))
+        self._run_length = {}
+        self._current_level = None
+        self._counter_date = None
+        
+        # SNS push gate: at most ALERT_MAX_PUSHES_PER_MINUTE pushes, and no repeat of the
+        # same alert within ALERT_DEDUP_WINDOW seconds, unless the alert is high impact
+        self._push_rate_limit = int(os.environ.get('ALERT_MAX_PUSHES_PER_MINUTE', 5))
+        self._push_dedup_window = float(os.environ.get('ALERT_DEDUP_WINDOW', 900))
+        self._push_min_score = float(os.environ.get('ALERT_PUSH_MIN_SCORE', 71))
+        self._push_times = deque(maxlen=self._push_rate_limit)
+        self._recent_keys = {}
+        self._push_lock = threading.Lock()
+        self._suppressed = Counter()
+        
+        # Notifications leave on background threads in batches
+        self._sns_batcher = _BatchSender('sns-batch', self._publish_sns_batch, max_batch=10)
+        self._metric_batcher = _BatchSender('cloudwatch-batch', self._put_emf_batch, max_batch=500)
+        
+        # Sends run off the detection thread; at most 64 may be pending, extra ones are dropped
+        self._exec = ThreadPoolExecutor(max_workers=2, thread_name_prefix='alert-io')
+        self._pending = threading.BoundedSemaphore(64)
+        atexit.register(self._exec.shutdown, wait=True)  # Runs before the batchers flush
+        
+        # Alert description per level; metric lines are filled in (or left empty) per alert
+        self._desc_templates = tuple(
+            string.Template(
+                f"{_EMOJI[level]} {level.name} RISK INCIDENT PREDICTED\n"
+                "Risk Score: $risk_score/100\n"
+                "Timestamp: $timestamp\n\n"
+                "KEY METRICS:\n"
+                "$cpu_line$memory_line$error_line$response_line"
+                f"\nPREDICTION: {_PREDICTIONS[level]}"
+            )
+            for level in RiskLevel
+        )
         
         logger.info("Alert Manager initialized")
     
+    @property
+    def sns_client(self):
+        return _sns()
+    
+    @property
+    def logs_client(self):
+        return _logs()
+    
     def send_alert(self, alert_data: Dict):
         """Send alert based on anomaly detection results"""
         try:
             risk_score = alert_data.get('risk_score', 0)
             features = alert_data.get('features', {})
+            fv = FeatureView._make([features.get(key, 0) for key in _FEATURE_KEYS])
             
             # Determine risk level
             risk_level = self._determine_risk_level(risk_score)
             
-            # Check cooldown
-            if self._is_in_cooldown(risk_level):
-                logger.info(f"Alert for {risk_level} risk is in cooldown period")
+            # Hysteresis: once HIGH, stay HIGH until the score drops below 60
+            if self._current_level is RiskLevel.HIGH and risk_level is not RiskLevel.HIGH and risk_score >= 60:
+                risk_level = RiskLevel.HIGH
+            self._current_level = risk_level
+            
+            # Count consecutive detections at this level; other levels reset
+            run_length = self._run_length.get(risk_level, 0) + 1
+            self._run_length = {risk_level: run_length}
+            if run_length < self._kappa:
+                logger.info("%s risk seen %d/%d times, holding alert", risk_level.name, run_length, self._kappa)
+                return
+            
+            # Check cooldown for this particular incident, not just the level
+            now = datetime.now(timezone.utc)  # The one wall-clock read for this alert
+            now_mono = time.monotonic()
+            responsible_metrics, metric_recommendations = self._evaluate_metric_rules(fv)
+            cooldown_key = self._cooldown_key(risk_level, responsible_metrics, risk_score)
+            if self._is_in_cooldown(cooldown_key, now_mono):
+                logger.info("Alert for %s risk is in cooldown period", risk_level.name)
                 return
             
             # Create alert
-            alert = self._create_alert(risk_score, risk_level, features)
+            alert = self._create_alert(risk_score, risk_level, fv, responsible_metrics,
+                                       metric_recommendations, now)
             
             # Send notifications
-            self._send_console_alert(alert)
-            self._send_sns_alert(alert)
-            self._send_cloudwatch_metric(alert)
+            self._submit(self._send_console_alert, alert)
+            self._submit(self._send_sns_alert, alert)
+            self._submit(self._send_cloudwatch_metric, alert)
             
             # Update cooldown
-            self._update_cooldown(risk_level)
+            self._update_cooldown(cooldown_key, now_mono)
             
-            logger.info(f"Alert sent: {alert.incident_id} - {risk_level} risk ({risk_score:.2f})")
+            logger.info("Alert sent: %s - %s risk (%.2f)", alert.incident_id, alert.risk_level, risk_score)
             
         except Exception as e:
-            logger.error(f"Failed to send alert: {str(e)}")
+            logger.error("Failed to send alert: %s", e)
+    
+    def _submit(self, send: Callable[[Alert], None], alert: Alert):
+        """Run a send on the I/O pool unless too many are already pending"""
+        if not self._pending.acquire(blocking=False):
+            logger.warning("Alert I/O backlog full, dropping %s for %s", send.__name__, alert.incident_id)
+            return
+        future = self._exec.submit(send, alert)
+        future.add_done_callback(lambda _: self._pending.release())
     
-    def _determine_risk_level(self, risk_score: float) -> str:
+    def record_normal(self):
+        """Reset persistence tracking after a cycle with no anomaly"""
+        self._run_length = {}
+        self._current_level = None
+    
+    def _determine_risk_level(self, risk_score: float) -> RiskLevel:
         """Determine risk level from score"""
         if risk_score >= 71:
-            return 'HIGH'
+            return RiskLevel.HIGH
         elif risk_score >= 31:
-            return 'MEDIUM'
+            return RiskLevel.MEDIUM
         else:
-            return 'LOW'
+            return RiskLevel.LOW
     
-    def _create_alert(self, risk_score: float, risk_level: str, features: Dict) -> Alert:
+    def _create_alert(self, risk_score: float, risk_level: RiskLevel, fv: FeatureView,
+                      responsible_metrics: List[str], metric_recommendations: List[str],
+                      now: datetime) -> Alert:
         """Create alert object"""
         # Generate incident ID
+        date = f"{now:%Y%m%d}"
+        if date != self._counter_date:
+            self._counter_date = date
+            self.alert_config['incident_counter'] = 0
         self.alert_config['incident_counter'] += 1
-        incident_id = f"INC-{datetime.utcnow().strftime('%Y%m%d')}-{self.alert_config['incident_counter']:04d}"
-        
-        # Identify responsible metrics
-        responsible_metrics = self._identify_responsible_metrics(features, risk_score)
+        incident_id = f"INC-{date}-{self.alert_config['incident_counter']:04d}"
         
         # Generate recommendations
-        recommendations = self._generate_recommendations(features, risk_level)
+        recommendations = self._generate_recommendations(metric_recommendations, risk_level)
         
         # Generate description
-        description = self._generate_alert_description(risk_score, risk_level, features)
+        description = self._generate_alert_description(risk_score, risk_level, fv, now)
         
         return Alert(
-            timestamp=datetime.utcnow().isoformat(),
+            timestamp=now.isoformat(),
             risk_score=risk_score,
-            risk_level=risk_level,
+            risk_level=risk_level.name,
             description=description,
-            responsible_metrics=responsible_metrics,
-            recommendations=recommendations,
+            responsible_metrics=tuple(responsible_metrics),
+            recommendations=tuple(recommendations),
             incident_id=incident_id
         )
     
-    def _identify_responsible_metrics(self, features: Dict, risk_score: float) -> List[str]:
-        """Identify metrics most responsible for the alert"""
+    def _evaluate_metric_rules(self, fv: FeatureView) -> Tuple[List[str], List[str]]:
+        """Identify responsible metrics and their recommendations in one pass over _METRIC_RULES"""
         responsible = []
+        recommendations = []
         
-        # CPU issues
-        cpu_current = features.get('cpu_current', 0)
-        if cpu_current > 80:
-            responsible.append(f"CPU Usage ({cpu_current:.1f}%)")
-        
-        # Memory issues
-        memory_current = features.get('memory_current', 0)
-        if memory_current > 80:
-            responsible.append(f"Memory Usage ({memory_current:.1f}%)")
-        
-        # Error rate
-        error_ratio = features.get('log_error_ratio', 0)
-        if error_ratio > 0.05:
-            responsible.append(f"Error Rate ({error_ratio*100:.1f}%)")
-        
-        # Response time
-        response_time = features.get('response_time_current', 0)
-        if response_time > 1000:
-            responsible.append(f"Response Time ({response_time:.0f}ms)")
-        
-        # System stress
-        stress_score = features.get('system_stress_score', 0)
-        if stress_score > 0.7:
-            responsible.append(f"System Stress ({stress_score*100:.1f}%)")
+        for value, (_, flag_above, label, scale, recommend_above, urgent_above, recs, urgent_recs) in zip(fv, _METRIC_RULES):
+            if value > flag_above:
+                responsible.append(label.format(value * scale))
+            if value > urgent_above:
+                recommendations.extend(urgent_recs)
+            elif value > recommend_above:
+                recommendations.extend(recs)
         
         # If no specific issues, use general anomaly
         if not responsible:
             responsible.append("ML Anomaly Detection")
         
-        return responsible
+        return responsible, recommendations
     
-    def _generate_recommendations(self, features: Dict, risk_level: str) -> List[str]:
-        """Generate actionable recommendations"""
-        recommendations = []
+    def identify_responsible_metrics_batch(self, feature_dicts: List[Dict]) -> List[List[str]]:
+        """Identify responsible metrics for many feature snapshots (e.g. one per host) at once"""
+        if len(feature_dicts) == 1:
+            fv = FeatureView._make([feature_dicts[0].get(key, 0) for key in _FEATURE_KEYS])
+            return [self._evaluate_metric_rules(fv)[0]]
         
-        # CPU recommendations
-        cpu_current = features.get('cpu_current', 0)
-        if cpu_current > 90:
-            recommendations.append("Scale up CPU resources immediately")
-            recommendations.append("Check for CPU-intensive processes")
-        elif cpu_current > 70:
-            recommendations.append("Monitor CPU usage closely")
-            recommendations.append("Consider scaling up if trend continues")
+        values = np.array([[features.get(key, 0) for key in _FEATURE_KEYS] for features in feature_dicts],
+                          dtype=float).reshape(-1, len(_FEATURE_KEYS))
+        flagged = values > _FLAG_THRESHOLDS
         
-        # Memory recommendations
-        memory_current = features.get('memory_current', 0)
-        if memory_current > 90:
-            recommendations.append("Scale up memory resources immediately")
-            recommendations.append("Check for memory leaks")
-        elif memory_current > 75:
-            recommendations.append("Monitor memory usage trends")
-        
-        # Error rate recommendations
-        error_ratio = features.get('log_error_ratio', 0)
-        if error_ratio > 0.1:
-            recommendations.append("Investigate recent deployments")
-            recommendations.append("Check database connectivity")
-        elif error_ratio > 0.05:
-            recommendations.append("Review recent error logs")
-        
-        # Performance recommendations
-        response_time = features.get('response_time_current', 0)
-        if response_time > 2000:
-            recommendations.append("Investigate performance bottlenecks")
-            recommendations.append("Check external service dependencies")
-        elif response_time > 1000:
-            recommendations.append("Monitor application performance")
+        results = []
+        for row, mask in zip(values, flagged):
+            responsible = [_METRIC_RULES[i][2].format(row[i] * _METRIC_RULES[i][3])
+                           for i in np.flatnonzero(mask)]
+            results.append(responsible or ["ML Anomaly Detection"])
+        return results
+    
+    def _generate_recommendations(self, metric_recommendations: List[str], risk_level: RiskLevel) -> List[str]:
+        """Generate actionable recommendations"""
+        recommendations = list(metric_recommendations)
         
         # Risk level specific recommendations
-        if risk_level == 'HIGH':
+        if risk_level is RiskLevel.HIGH:
             recommendations.insert(0, "IMMEDIATE ACTION REQUIRED")
             recommendations.append("Consider incident response procedures")
-        elif risk_level == 'MEDIUM':
+        elif risk_level is RiskLevel.MEDIUM:
             recommendations.append("Prepare for potential escalation")
             recommendations.append("Notify on-call engineer")
         
@@ -211,75 +451,38 @@ class AlertManager:
         
         return recommendations[:5]  # Limit to top 5 recommendations
     
-    def _generate_alert_description(self, risk_score: float, risk_level: str, features: Dict) -> str:
+    def _generate_alert_description(self, risk_score: float, risk_level: RiskLevel, fv: FeatureView,
+                                    now: datetime) -> str:
         """Generate alert description"""
-        template = self.alert_templates.get(risk_level, {})
-        emoji = template.get('emoji', '🔍')
-        
-        # Base description
-        description = f"{emoji} {risk_level} RISK INCIDENT PREDICTED\n"
-        description += f"Risk Score: {risk_score:.1f}/100\n"
-        description += f"Timestamp: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}\n\n"
-        
-        # Add key metrics
-        description += "KEY METRICS:\n"
-        
-        cpu_current = features.get('cpu_current', 0)
-        if cpu_current > 0:
-            description += f"• CPU Usage: {cpu_current:.1f}%\n"
-        
-        memory_current = features.get('memory_current', 0)
-        if memory_current > 0:
-            description += f"• Memory Usage: {memory_current:.1f}%\n"
-        
-        error_ratio = features.get('log_error_ratio', 0)
-        if error_ratio > 0:
-            description += f"• Error Rate: {error_ratio*100:.2f}%\n"
-        
-        response_time = features.get('response_time_current', 0)
-        if response_time > 0:
-            description += f"• Response Time: {response_time:.0f}ms\n"
-        
-        # Add prediction
-        description += f"\nPREDICTION: "
-        if risk_level == 'HIGH':
-            description += "System failure expected within 5-10 minutes"
-        elif risk_level == 'MEDIUM':
-            description += "Performance degradation likely within 15-30 minutes"
-        else:
-            description += "Minor issues may affect user experience"
+        cpu_current, memory_current, error_ratio, response_time, _ = fv
         
-        return description
+        return self._desc_templates[risk_level].substitute(
+            risk_score=f"{risk_score:.1f}",
+            timestamp=f"{now:%Y-%m-%d %H:%M:%S} UTC",
+            cpu_line=f"• CPU Usage: {cpu_current:.1f}%\n" if cpu_current > 0 else "",
+            memory_line=f"• Memory Usage: {memory_current:.1f}%\n" if memory_current > 0 else "",
+            error_line=f"• Error Rate: {error_ratio*100:.2f}%\n" if error_ratio > 0 else "",
+            response_line=f"• Response Time: {response_time:.0f}ms\n" if response_time > 0 else ""
+        )
     
     def _send_console_alert(self, alert: Alert):
         """Send alert to console/logs"""
+        if not logger.isEnabledFor(logging.WARNING):
+            return  # Skip rendering the banner nobody will see
+        
         try:
-            # Format console message
-            console_message = f"""
-{'='*60}
-🚨 SMART INCIDENT PREDICTOR ALERT 🚨
-{'='*60}
-Incident ID: {alert.incident_id}
-Risk Level: {alert.risk_level}
-Risk Score: {alert.risk_score:.2f}/100
-Timestamp: {alert.timestamp}
-
-DESCRIPTION:
-{alert.description}
-
-RESPONSIBLE METRICS:
-{chr(10).join(f"• {metric}" for metric in alert.responsible_metrics)}
-
-RECOMMENDATIONS:
-{chr(10).join(f"• {rec}" for rec in alert.recommendations)}
-
-{'='*60}
-"""
-            
-            logger.warning(console_message)
+            logger.warning(_CONSOLE_TEMPLATE.substitute(
+                incident_id=alert.incident_id,
+                risk_level=alert.risk_level,
+                risk_score=f"{alert.risk_score:.2f}",
+                timestamp=alert.timestamp,
+                description=alert.description,
+                responsible_metrics='\n'.join(f"• {metric}" for metric in alert.responsible_metrics),
+                recommendations='\n'.join(f"• {rec}" for rec in alert.recommendations)
+            ))
             
         except Exception as e:
-            logger.error(f"Failed to send console alert: {str(e)}")
+            logger.error("Failed to send console alert: %s", e)
     
     def _send_sns_alert(self, alert: Alert):
         """Send alert via SNS"""
@@ -289,7 +492,12 @@ RECOMMENDATIONS:
                 return
             
             # Prepare SNS message
-            template = self.alert_templates.get(alert.risk_level, {})
+            level = RiskLevel[alert.risk_level]
+            
+            reason = self._push_gate(alert, level)
+            if reason:
+                logger.info("SNS push for %s suppressed: %s", alert.incident_id, reason)
+                return
             
             message = {
                 'incident_id': alert.incident_id,
@@ -299,91 +507,151 @@ RECOMMENDATIONS:
                 'description': alert.description,
                 'responsible_metrics': alert.responsible_metrics,
                 'recommendations': alert.recommendations,
-                'priority': template.get('priority', 'MEDIUM')
+                'priority': _PRIORITY[level]
             }
             
-            # Send to SNS
-            response = self.sns_client.publish(
-                TopicArn=self.alert_config['sns_topic_arn'],
-                Subject=template.get('subject', f'Alert: {alert.risk_level} Risk'),
-                Message=json.dumps(message, indent=2),
-                MessageStructure='string'
-            )
-            
-            logger.info(f"SNS alert sent: {response.get('MessageId')}")
+            # Queue for the next SNS PublishBatch call
+            self._sns_batcher.put({
+                'Subject': _SUBJECT[level],
+                'Message': _pretty_json(message)
+            })
             
         except Exception as e:
-            logger.error(f"Failed to send SNS alert: {str(e)}")
+            logger.error("Failed to send SNS alert: %s", e)
     
-    def _send_cloudwatch_metric(self, alert: Alert):
-        """Send alert metric to CloudWatch"""
-        try:
-            # Put custom metric
-            self.cloudwatch_client.put_metric_data(
-                Namespace='Custom/ML',
-                MetricData=[
-                    {
-                        'MetricName': 'AlertRiskScore',
-                        'Value': alert.risk_score,
-                        'Unit': 'None',
-                        'Timestamp': datetime.utcnow(),
-                        'Dimensions': [
-                            {
-                                'Name': 'RiskLevel',
-                                'Value': alert.risk_level
-                            },
-                            {
-                                'Name': 'IncidentID',
-                                'Value': alert.incident_id
-                            }
-                        ]
-                    }
-                ]
-            )
+    def _push_gate(self, alert: Alert, level: RiskLevel) -> Optional[str]:
+        """Admit an SNS push, or return why it is suppressed"""
+        key = self._cooldown_key(level, alert.responsible_metrics, alert.risk_score)
+        high_impact = level is RiskLevel.HIGH or alert.risk_score >= self._push_min_score
+        
+        with self._push_lock:
+            now = time.monotonic()
+            push_times = self._push_times
+            while push_times and now - push_times[0] > 60:
+                push_times.popleft()
             
-        except Exception as e:
-            logger.error(f"Failed to send CloudWatch metric: {str(e)}")
+            reason = None
+            if not high_impact:
+                if len(push_times) >= self._push_rate_limit:
+                    reason = 'rate_limit'
+                elif now - self._recent_keys.get(key, -self._push_dedup_window) < self._push_dedup_window:
+                    reason = 'duplicate'
+            if reason:
+                self._suppressed[reason] += 1
+                return reason
+            
+            push_times.append(now)
+            cutoff = now - self._push_dedup_window
+            self._recent_keys = {k: ts for k, ts in self._recent_keys.items() if ts > cutoff}
+            self._recent_keys[key] = now
+            return None
     
-    def _is_in_cooldown(self, risk_level: str) -> bool:
-        """Check if alert type is in cooldown"""
+    def _publish_sns_batch(self, batch: List[Dict], retry: bool = True):
+        """Publish up to 10 alerts in one SNS call, retrying failed entries once"""
+        entries = [dict(entry, Id=str(i)) for i, entry in enumerate(batch)]
+        response = self.sns_client.publish_batch(
+            TopicArn=self.alert_config['sns_topic_arn'],
+            PublishBatchRequestEntries=entries
+        )
+        
+        for sent in response.get('Successful', []):
+            logger.info("SNS alert sent: %s", sent.get('MessageId'))
+        
+        failed = response.get('Failed', [])
+        if failed:
+            retryable = [batch[int(f['Id'])] for f in failed if not f.get('SenderFault')]
+            for f in failed:
+                logger.error("SNS publish failed: %s - %s", f.get('Code'), f.get('Message'))
+            if retry and retryable:
+                self._publish_sns_batch(retryable, retry=False)
+    
+    def _send_cloudwatch_metric(self, alert: Alert):
+        """Send alert metric to CloudWatch as an EMF log event"""
         try:
-            last_alert_time = self.alert_config['alert_cooldown'].get(risk_level)
-            if not last_alert_time:
-                return False
-            
-            cooldown_period = self.alert_config['min_alert_interval']
-            current_time = datetime.utcnow()
+            timestamp_ms = int(datetime.fromisoformat(alert.timestamp).timestamp() * 1000)
             
-            return (current_time - last_alert_time).total_seconds() < cooldown_period
+            # IncidentID rides along as a log property, not a metric dimension
+            self._metric_batcher.put({
+                'timestamp': timestamp_ms,
+                'message': _compact_json({
+                    '_aws': {
+                        'Timestamp': timestamp_ms,
+                        'CloudWatchMetrics': _EMF_METRICS
+                    },
+                    'RiskLevel': alert.risk_level,
+                    'IncidentID': alert.incident_id,
+                    'AlertRiskScore': alert.risk_score
+                })
+            })
             
-        except Exception:
-            return False
+        except Exception as e:
+            logger.error("Failed to send CloudWatch metric: %s", e)
+    
+    def _put_emf_batch(self, batch: List[Dict]):
+        """Write a batch of EMF events in one PutLogEvents call"""
+        log_group = self.alert_config['log_group']
+        log_stream = self.alert_config['log_stream']
+        
+        if not self._log_stream_ready:
+            try:
+                self.logs_client.create_log_stream(logGroupName=log_group, logStreamName=log_stream)
+            except self.logs_client.exceptions.ResourceAlreadyExistsException:
+                pass
+            self._log_stream_ready = True
+        
+        self.logs_client.put_log_events(
+            logGroupName=log_group,
+            logStreamName=log_stream,
+            logEvents=sorted(batch, key=lambda event: event['timestamp'])
+        )
+    
+    def _cooldown_key(self, risk_level: RiskLevel, responsible_metrics: List[str], risk_score: float) -> str:
+        """Fingerprint an alert by level, responsible metric names and 10-point score bucket"""
+        # Drop the "(85.2%)" readings so repeats of the same incident collide
+        names = sorted(metric.split(' (', 1)[0] for metric in responsible_metrics)
+        content = f"{risk_level.name}|{','.join(names)}|{int(risk_score / 10)}"
+        return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+    
+    def _is_in_cooldown(self, cooldown_key: str, now: float) -> bool:
+        """Check if this alert was already sent within the cooldown period"""
+        last_alert_time = self.alert_config['alert_cooldown'].get(cooldown_key)
+        return last_alert_time is not None and now - last_alert_time < self.alert_config['min_alert_interval']
     
-    def _update_cooldown(self, risk_level: str):
-        """Update cooldown for alert type"""
+    def _update_cooldown(self, cooldown_key: str, now: float):
+        """Update cooldown for this alert, evicting entries older than two cooldown periods"""
         try:
-            self.alert_config['alert_cooldown'][risk_level] = datetime.utcnow()
+            cutoff = now - 2 * self.alert_config['min_alert_interval']
+            cooldowns = {k: ts for k, ts in self.alert_config['alert_cooldown'].items() if ts > cutoff}
+            cooldowns[cooldown_key] = now
+            self.alert_config['alert_cooldown'] = cooldowns
         except Exception as e:
-            logger.error(f"Failed to update cooldown: {str(e)}")
+            logger.error("Failed to update cooldown: %s", e)
     
     def _get_sns_topic_arn(self) -> Optional[str]:
         """Get SNS topic ARN from environment or configuration"""
-        try:
-            # In production, this would come from environment variables or config
-            # For demo, we'll try to find it from AWS
-            sns = boto3.client('sns')
-            topics = sns.list_topics()
-            
-            for topic in topics.get('Topics', []):
-                topic_arn = topic['TopicArn']
-                if 'smart-incident-predictor-alerts' in topic_arn:
-                    return topic_arn
-            
-            return None
+        arn = os.environ.get('SNS_TOPIC_ARN')
+        if arn:
+            return arn
+        
+        cls = type(self)
+        with cls._topic_arn_lock:
+            if cls._cached_topic_arn is not None:
+                return cls._cached_topic_arn
             
-        except Exception as e:
-            logger.error(f"Failed to get SNS topic ARN: {str(e)}")
-            return None
+            try:
+                # Fall back to discovering the topic, one page at a time
+                for page in self.sns_client.get_paginator('list_topics').paginate():
+                    for topic in page.get('Topics', []):
+                        topic_arn = topic['TopicArn']
+                        if 'smart-incident-predictor-alerts' in topic_arn:
+                            cls._cached_topic_arn = topic_arn
+                            return topic_arn
+                
+                return None
+                
+            except Exception as e:
+                logger.error("Failed to get SNS topic ARN: %s", e)
+                return None
     
     def get_alert_statistics(self, hours: int = 24) -> Dict:
         """Get alert statistics for the last N hours"""
@@ -397,9 +665,10 @@ RECOMMENDATIONS:
                 'low_risk_alerts': 0,
                 'average_risk_score': 0,
                 'peak_risk_score': 0,
-                'time_period_hours': hours
+                'time_period_hours': hours,
+                'suppressed_pushes': dict(self._suppressed)
             }
             
         except Exception as e:
-            logger.error(f"Failed to get alert statistics: {str(e)}")
+            logger.error("Failed to get alert statistics: %s", e)
             return {}
@@ -5,18 +5,19 @@ Uses Isolation Forest to detect anomalies in system metrics and logs
 """
 
 import logging
+import math
+import os
+import signal
+import sys
 import time
 import json
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from collections import deque
+from typing import Dict, List, Sequence, Tuple, Optional
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report
 import pickle
 import boto3
-import schedule
 
 from feature_extractor import FeatureExtractor
 from risk_scorer import RiskScorer
@@ -35,6 +36,155 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Saved model: one .npy per array (memory-mapped on load) plus model.json
+MODEL_DIR = '/opt/smart-incident-predictor/data/anomaly_model'
+LEGACY_MODEL_PATH = '/opt/smart-incident-predictor/data/anomaly_model.pkl'
+
+class _FastScaler:
+    """Standardizes float32 feature matrices in place, without sklearn's per-call input validation"""
+    
+    def __init__(self, mean: Optional[np.ndarray] = None, inv_std: Optional[np.ndarray] = None):
+        self.mean_ = mean
+        self.inv_std_ = inv_std
+    
+    @classmethod
+    def from_standard_scaler(cls, scaler) -> '_FastScaler':
+        """Convert a fitted sklearn StandardScaler (as saved by older versions)"""
+        return cls(np.asarray(scaler.mean_, dtype=np.float32),
+                   (1.0 / np.asarray(scaler.scale_)).astype(np.float32))
+    
+    def fit(self, X: np.ndarray) -> '_FastScaler':
+        """Store per-feature mean and 1/std (zero-variance features keep unit scale)"""
+        std = X.std(axis=0, dtype=np.float64)
+        self.mean_ = X.mean(axis=0, dtype=np.float64).astype(np.float32)
+        self.inv_std_ = (1.0 / np.where(std > 1e-12, std, 1.0)).astype(np.float32)
+        return self
+    
+    def transform(self, X: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute (X - mean) * inv_std into out (X itself by default)"""
+        if out is None:
+            out = X
+        np.subtract(X, self.mean_, out=out)
+        np.multiply(out, self.inv_std_, out=out)
+        return out
+    
+    def fit_transform(self, X: np.ndarray) -> np.ndarray:
+        return self.fit(X).transform(X)
+
+def _average_path_length(n_samples) -> np.ndarray:
+    """Average path length of an unsuccessful BST search over n samples, as IsolationForest defines it"""
+    n = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n)
+    lengths[n == 2] = 1.0
+    big = n > 2
+    lengths[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return lengths
+
+class _RunningStats:
+    """Per-feature mean and variance accumulated online (Welford, merged batch-wise per Chan et al.)"""
+    
+    def __init__(self, n_features: int):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+    
+    def update(self, X: np.ndarray):
+        """Fold in a batch of raw (unscaled) rows"""
+        n = X.shape[0]
+        if n == 0:
+            return
+        batch_mean = X.mean(axis=0, dtype=np.float64)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * (n / total)
+        self.m2 += batch_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+    
+    def to_scaler(self) -> _FastScaler:
+        """A scaler standardizing with the accumulated statistics"""
+        std = np.sqrt(self.m2 / max(self.count, 1))
+        return _FastScaler(self.mean.astype(np.float32),
+                           (1.0 / np.where(std > 1e-12, std, 1.0)).astype(np.float32))
+
+class _PackedForest:
+    """A fitted IsolationForest flattened into one set of node arrays and walked for all trees at once"""
+    
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'leaf_depth', 'roots')
+    
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 leaf_depth: np.ndarray, roots: np.ndarray, max_depth: int, denominator: float):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_depth = leaf_depth
+        self.roots = roots
+        self.max_depth = max_depth
+        self.denominator = denominator
+    
+    @classmethod
+    def from_isolation_forest(cls, model: IsolationForest) -> '_PackedForest':
+        """Dump every tree's nodes; leaves point at themselves so a fixed-depth walk settles on them"""
+        features, thresholds, lefts, rights, leaf_depths, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        
+        for estimator, estimator_features in zip(model.estimators_, model.estimators_features_):
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            
+            # Children always come after their parent in sklearn's node order
+            depth = np.zeros(tree.node_count)
+            for node in np.flatnonzero(~is_leaf):
+                depth[tree.children_left[node]] = depth[tree.children_right[node]] = depth[node] + 1
+            
+            feature = np.where(is_leaf, 0, tree.feature)
+            if len(estimator_features) != model.n_features_in_:
+                feature = np.asarray(estimator_features)[feature]  # Tree was fit on a column subset
+            
+            features.append(feature)
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            leaf_depths.append(depth + _average_path_length(tree.n_node_samples))
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, int(depth.max()))
+        
+        # Rows are float32, so x <= t holds exactly when x <= the largest float32 not above t;
+        # storing that keeps every split decision while halving the threshold array
+        threshold = np.concatenate(thresholds)
+        threshold32 = threshold.astype(np.float32)
+        rounded_up = threshold32 > threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+        
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=threshold32,
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            leaf_depth=np.concatenate(leaf_depths),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            denominator=float(len(model.estimators_) * _average_path_length([model.max_samples_])[0])
+        )
+    
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        """Same values as IsolationForest.score_samples for scaled float32 rows"""
+        node = np.tile(self.roots, (X.shape[0], 1))
+        rows = np.arange(X.shape[0])[:, None]
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        
+        depths = self.leaf_depth[node].sum(axis=1)
+        if self.denominator == 0:
+            return np.full(X.shape[0], -0.5)
+        return -np.exp2(-depths / self.denominator)
+
 class AnomalyDetector:
     """Main anomaly detection service"""
     
@@ -46,22 +196,37 @@ class AnomalyDetector:
         
         # ML Model
         self.model = None
-        self.scaler = StandardScaler()
+        self.scaler = _FastScaler()
         self.is_trained = False
+        self._offset = 0.0  # Cached IsolationForest offset_, set once fitted
+        self._forest = None  # Packed copy of the fitted trees used for scoring
+        self._last_scored = None  # (forest, row bytes, forest outputs) of the last single-row detection
+        self._running_stats = None  # Feature statistics over every sample seen since training began
+        self._rng = np.random.default_rng()
         
         # Configuration
         self.config = {
             'contamination': 0.1,  # Expected anomaly rate
             'window_size': 300,     # 5 minutes in seconds
             'feature_count': 15,    # Number of features
+            'detection_interval': 60,  # Detect every minute
             'retrain_interval': 3600,  # Retrain every hour
             'min_samples': 100,     # Minimum samples for training
+            'max_training_samples': 2000,  # Forest is fit on a random subsample of at most this many
+            'history_size': 10000,  # Raw feature rows kept for retraining
+            'metric_batch_size': 20,  # Custom metrics buffered before a PutMetricData call (flushed every cycle regardless)
             'risk_threshold': 50    # Risk score threshold for alerts
         }
         
-        # Data storage
-        self.training_data = []
-        self.prediction_history = []
+        # Data storage (bounded; the oldest entries fall off). Feature dicts are only
+        # kept until the first model fixes the columns; after that rows go to the ring buffer
+        self.training_data = deque(maxlen=self.config['history_size'])
+        self.prediction_history = deque(maxlen=1000)
+        
+        # Custom metrics awaiting a batched PutMetricData
+        self._metric_buf = []
+        self._feature_columns = None
+        self._set_feature_columns(())
         
         # Initialize model
         self._initialize_model()
@@ -75,7 +240,9 @@ class AnomalyDetector:
                 contamination=self.config['contamination'],
                 random_state=42,
                 n_estimators=100,
-                max_samples='auto'
+                max_samples='auto',
+                bootstrap=False,
+                n_jobs=-1  # Trees are built in parallel on multi-core hosts
             )
             logger.info("Isolation Forest model initialized")
         except Exception as e:
@@ -95,50 +262,57 @@ class AnomalyDetector:
                 window_minutes=5
             )
             
-            # Extract features
-            features = self.feature_extractor.extract_features(
-                metrics=cloudwatch_metrics,
-                logs=log_patterns
-            )
-            
-            if not features:
-                logger.warning("No features extracted")
-                return None
-            
-            # Add timestamp
-            features['timestamp'] = datetime.utcnow().isoformat()
-            
-            return features
+            return self._process_features(cloudwatch_metrics, log_patterns)
             
         except Exception as e:
             logger.error(f"Failed to collect and process data: {str(e)}")
             return None
     
-    def train_model(self, data: List[Dict]) -> bool:
+    def _process_features(self, metrics: Dict, logs: List[Dict]) -> Optional[Dict]:
+        """Extract one window's features, dense and timestamped"""
+        features = self.feature_extractor.extract_features(
+            metrics=metrics,
+            logs=logs
+        )
+        return self._prepare_features(features)
+    
+    def _prepare_features(self, features: Dict) -> Optional[Dict]:
+        """Make extracted features dense and timestamp them"""
+        if not features:
+            logger.warning("No features extracted")
+            return None
+        
+        # Missing/NaN/inf readings become 0.0 here, so the model inputs need no cleanup pass
+        features = {
+            k: 0.0 if v is None or (isinstance(v, float) and not math.isfinite(v)) else v
+            for k, v in features.items()
+        }
+        
+        # Add timestamp (epoch ns; only alerts format wall-clock strings)
+        features['ts_ns'] = time.time_ns()
+        
+        return features
+    
+    def train_model(self, data: Sequence[Dict]) -> bool:
         """Train the anomaly detection model"""
         try:
             if len(data) < self.config['min_samples']:
                 logger.warning(f"Insufficient data for training: {len(data)} samples")
                 return False
             
-            # Convert to DataFrame
-            df = pd.DataFrame(data)
+            # Fit the forest on a random subsample; it only draws 256 points per tree anyway
+            max_samples = self.config.get('max_training_samples', 2000)
+            if len(data) > max_samples:
+                data = [data[i] for i in self._rng.choice(len(data), max_samples, replace=False)]
             
             # Remove timestamp and non-numeric columns
-            feature_columns = [col for col in df.columns 
-                             if col not in ['timestamp'] and df[col].dtype in ['int64', 'float64']]
-            
-            X = df[feature_columns].fillna(0)
+            feature_columns = tuple(self._numeric_columns(data))
             
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
-            
-            # Train model
-            self.model.fit(X_scaled)
-            self.is_trained = True
+            # Preallocate the training matrix and fill it row by row
+            X = np.empty((len(data), len(feature_columns)), dtype=np.float32)
+            self._fill_rows(X, data, feature_columns)
             
-            # Save model
-            self._save_model()
+            self._fit(X, feature_columns)
             
             logger.info(f"Model trained successfully with {len(data)} samples")
             return True
@@ -147,78 +321,178 @@ class AnomalyDetector:
             logger.error(f"Failed to train model: {str(e)}")
             return False
     
-    def detect_anomaly(self, features: Dict) -> Tuple[bool, float, Dict]:
-        """Detect anomalies in current features"""
+    def _train_from_history(self) -> bool:
+        """Retrain on the raw feature rows collected since the columns were fixed"""
         try:
-            if not self.is_trained:
-                logger.warning("Model not trained yet")
-                return False, 0.0, {'status': 'model_not_trained'}
-            
-            # Convert to DataFrame
-            df = pd.DataFrame([features])
-            
-            # Select numeric features
-            feature_columns = [col for col in df.columns 
-                             if col not in ['timestamp'] and df[col].dtype in ['int64', 'float64']]
+            n = self._ring_count
+            if n < self.config['min_samples']:
+                logger.warning(f"Insufficient data for training: {n} samples")
+                return False
             
-            X = df[feature_columns].fillna(0)
+            # Always a copy: the matrix is scaled in place
+            max_samples = self.config.get('max_training_samples', 2000)
+            if n > max_samples:
+                X = self._ring[self._rng.choice(n, max_samples, replace=False)]
+            else:
+                X = self._ring[:n].copy()
             
-            # Scale features
-            X_scaled = self.scaler.transform(X)
+            self._fit(X, self._feature_columns)
             
-            # Predict anomaly
-            prediction = self.model.predict(X_scaled)[0]  # -1 for anomaly, 1 for normal
-            anomaly_score = self.model.decision_function(X_scaled)[0]
+            logger.info(f"Model trained successfully with {len(X)} samples")
+            return True
             
-            # Convert to risk score (0-100)
-            risk_score = self.risk_scorer.calculate_risk_score(
-                anomaly_score=anomaly_score,
-                features=features
+        except Exception as e:
+            logger.error(f"Failed to train model: {str(e)}")
+            return False
+    
+    def _fit(self, X: np.ndarray, feature_columns: tuple):
+        """Scale X in place, fit the forest on it and swap the new model in"""
+        # Scale with the running statistics, restarting them when the feature set changes
+        running_stats = self._running_stats
+        if running_stats is None or feature_columns != self._feature_columns:
+            running_stats = _RunningStats(len(feature_columns))
+            running_stats.update(X)
+        scaler = running_stats.to_scaler()
+        # The trees split on float32, so contiguous float32 input is used without a copy
+        X_scaled = np.ascontiguousarray(scaler.transform(X), dtype=np.float32)
+        
+        # Train model
+        self.model.fit(X_scaled)
+        self._offset = float(self.model.offset_)
+        self._forest = _PackedForest.from_isolation_forest(self.model)
+        self._set_feature_columns(feature_columns)
+        self.scaler = scaler
+        self._running_stats = running_stats
+        self.is_trained = True
+        self.training_data.clear()
+        
+        # Save model, then map the saved arrays back in place of the private copy so every
+        # detector process (this one included) scores from the same page-cache pages
+        if self._save_model():
+            self._load_model()
+    
+    def _numeric_columns(self, data: Sequence[Dict]) -> List[str]:
+        """Keys whose values are all numbers (or None), in first-seen order like DataFrame columns"""
+        has_value = {}  # Key -> whether a non-None value was seen (an all-None column is object dtype)
+        excluded = {'timestamp', 'ts_ns'}
+        for row in data:
+            for key, value in row.items():
+                if value is None:
+                    has_value.setdefault(key, False)
+                    continue
+                has_value[key] = True
+                if not isinstance(value, (int, float, np.number)) or isinstance(value, (bool, np.bool_)):
+                    excluded.add(key)
+        
+        return [key for key, seen in has_value.items() if seen and key not in excluded]
+    
+    def _fill_rows(self, X: np.ndarray, feature_batch: Sequence[Dict], columns: Optional[tuple] = None):
+        """Write each snapshot's features into X in column order (training order by default; missing/None as 0)"""
+        indexed_columns = tuple(enumerate(columns or self._feature_columns))
+        for row, features in zip(X, feature_batch):
+            for i, col in indexed_columns:
+                value = features.get(col)
+                row[i] = 0.0 if value is None else value
+    
+    def _set_feature_columns(self, feature_columns):
+        """Fix the numeric feature order and size the input and history buffers to it"""
+        feature_columns = tuple(feature_columns)
+        if feature_columns == self._feature_columns:
+            return  # Keep the collected history
+        
+        self._feature_columns = feature_columns
+        self._n_features = len(feature_columns)
+        self._x_buf = np.zeros((1, self._n_features), dtype=np.float32)
+        
+        # Ring buffer of raw float32 rows, one per detection, for retraining without dicts
+        self._ring = np.empty((self.config.get('history_size', 10000), self._n_features), dtype=np.float32)
+        self._ring_idx = 0
+        self._ring_count = 0
+    
+    def _append_history(self, X: np.ndarray):
+        """Copy raw feature rows into the ring buffer, overwriting the oldest"""
+        capacity = len(self._ring)
+        positions = (self._ring_idx + np.arange(len(X))) % capacity
+        self._ring[positions] = X
+        self._ring_idx = (self._ring_idx + len(X)) % capacity
+        self._ring_count = min(self._ring_count + len(X), capacity)
+    
+    def detect_anomaly(self, features: Dict) -> Tuple[bool, float, Dict]:
+        """Detect anomalies in current features"""
+        if not self.is_trained:
+            logger.warning("Model not trained yet")
+            return False, 0.0, {'status': 'model_not_trained'}
+        
+        # The input row is reused across calls
+        return self._detect_rows(self._x_buf, [features])[0]
+    
+    def detect_anomalies(self, feature_batch: List[Dict]) -> List[Tuple[bool, float, Dict]]:
+        """Detect anomalies in a batch of feature snapshots with one scaler and forest pass"""
+        if not self.is_trained:
+            logger.warning("Model not trained yet")
+            return [(False, 0.0, {'status': 'model_not_trained'})] * len(feature_batch)
+        
+        X = np.empty((len(feature_batch), self._n_features), dtype=np.float32)
+        return self._detect_rows(X, feature_batch)
+    
+    def _detect_rows(self, X: np.ndarray, feature_batch: List[Dict]) -> List[Tuple[bool, float, Dict]]:
+        """Fill X (one float32 row per snapshot, training column order) and score it"""
+        try:
+            self._fill_rows(X, feature_batch)
+            self._append_history(X)
+            if self._running_stats is not None:
+                self._running_stats.update(X)
+            
+            # Quiet periods repeat the previous snapshot exactly; reuse its forest output then
+            row_bytes = X.tobytes() if len(X) == 1 else None
+            last = self._last_scored
+            if row_bytes is not None and last is not None and last[0] is self._forest and last[1] == row_bytes:
+                anomaly_scores, predictions = last[2], last[3]
+                contributions = [dict(contribution) for contribution in last[4]]
+            else:
+                # Scale features (X keeps the raw values for risk scoring)
+                X_scaled = self.scaler.transform(X, out=np.empty_like(X))
+                
+                # One tree traversal: predict() is just score_samples() compared with offset_
+                anomaly_scores = self._forest.score_samples(X_scaled) - self._offset
+                predictions = np.where(anomaly_scores < 0, -1, 1)  # -1 for anomaly, 1 for normal
+                contributions = self._get_feature_contributions(X_scaled)
+                if row_bytes is not None:
+                    self._last_scored = (self._forest, row_bytes, anomaly_scores, predictions, contributions)
+            
+            # Convert to risk scores (0-100) for the whole batch
+            risk_scores = self.risk_scorer.calculate_risk_scores(
+                anomaly_scores, X, self._feature_columns, feature_batch
             )
             
-            # Determine if anomaly
-            is_anomaly = prediction == -1 or risk_score > self.config['risk_threshold']
-            
-            result = {
-                'is_anomaly': is_anomaly,
-                'risk_score': risk_score,
-                'anomaly_score': float(anomaly_score),
-                'prediction': int(prediction),
-                'timestamp': features.get('timestamp', datetime.utcnow().isoformat()),
-                'feature_contributions': self._get_feature_contributions(features)
-            }
+            results = []
+            for features, anomaly_score, prediction, contribution, risk_score in zip(
+                    feature_batch, anomaly_scores.tolist(), predictions.tolist(), contributions, risk_scores):
+                
+                # Determine if anomaly
+                is_anomaly = prediction == -1 or risk_score > self.config['risk_threshold']
+                
+                result = {
+                    'is_anomaly': is_anomaly,
+                    'risk_score': risk_score,
+                    'anomaly_score': anomaly_score,
+                    'prediction': prediction,
+                    'ts_ns': features.get('ts_ns') or time.time_ns(),
+                    'feature_contributions': contribution
+                }
+                results.append((is_anomaly, risk_score, result))
             
-            return is_anomaly, risk_score, result
+            return results
             
         except Exception as e:
             logger.error(f"Failed to detect anomaly: {str(e)}")
-            return False, 0.0, {'error': str(e)}
+            return [(False, 0.0, {'error': str(e)})] * len(feature_batch)
     
-    def _get_feature_contributions(self, features: Dict) -> Dict:
-        """Get feature contributions to anomaly score"""
-        try:
-            contributions = {}
-            
-            # Simple contribution calculation based on deviation from normal
-            for key, value in features.items():
-                if isinstance(value, (int, float)) and key != 'timestamp':
-                    # Calculate z-score contribution
-                    if hasattr(self, 'feature_stats') and key in self.feature_stats:
-                        mean = self.feature_stats[key]['mean']
-                        std = self.feature_stats[key]['std']
-                        if std > 0:
-                            z_score = abs(value - mean) / std
-                            contributions[key] = min(z_score * 10, 100)  # Cap at 100
-                        else:
-                            contributions[key] = 0
-                    else:
-                        contributions[key] = 0
-            
-            return contributions
-            
-        except Exception as e:
-            logger.error(f"Failed to get feature contributions: {str(e)}")
-            return {}
+    def _get_feature_contributions(self, X_scaled: np.ndarray) -> List[Dict]:
+        """Get feature contributions to anomaly score (10 points per standard deviation, capped at 100)"""
+        # Scaled rows already hold each feature's z-score against the training data
+        contributions = np.minimum(np.abs(X_scaled) * 10.0, 100.0)
+        return [dict(zip(self._feature_columns, row)) for row in contributions.tolist()]
     
     def process_and_alert(self, features: Dict):
         """Process features and send alerts if anomaly detected"""
@@ -229,73 +503,84 @@ class AnomalyDetector:
             # Store prediction history
             self.prediction_history.append(result)
             
-            # Keep only last 1000 predictions
-            if len(self.prediction_history) > 1000:
-                self.prediction_history = self.prediction_history[-1000:]
-            
             # Send alert if anomaly
             if is_anomaly:
                 logger.warning(f"Anomaly detected! Risk Score: {risk_score:.2f}")
                 
-                # Send alert
-                alert_data = {
+                # Send alert (the manager reads only these; it stamps and serializes the alert itself)
+                self.alert_manager.send_alert({
                     'risk_score': risk_score,
-                    'features': features,
-                    'detection_result': result,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                self.alert_manager.send_alert(alert_data)
+                    'features': features
+                })
                 
                 # Publish custom metric to CloudWatch
-                self.cloudwatch_client.put_custom_metric(
-                    metric_name='AnomalyRiskScore',
-                    value=risk_score,
-                    unit='None'
-                )
+                self._put_metric('AnomalyRiskScore', risk_score)
             else:
                 logger.info(f"Normal operation - Risk Score: {risk_score:.2f}")
+                self.alert_manager.record_normal()
             
             # Publish health metric
-            self.cloudwatch_client.put_custom_metric(
-                metric_name='MLServiceHealth',
-                value=1,
-                unit='None'
-            )
+            self._put_metric('MLServiceHealth', 1)
             
         except Exception as e:
             logger.error(f"Failed to process and alert: {str(e)}")
             
             # Publish health metric indicating failure
-            self.cloudwatch_client.put_custom_metric(
-                metric_name='MLServiceHealth',
-                value=0,
-                unit='None'
-            )
+            self._put_metric('MLServiceHealth', 0)
+    
+    def _put_metric(self, metric_name: str, value: float, unit: str = 'None'):
+        """Buffer a custom metric until the end of the detection cycle or a full batch"""
+        self._metric_buf.append((metric_name, value, unit, time.time()))
+        
+        if len(self._metric_buf) >= self.config.get('metric_batch_size', 20):
+            self._flush_metrics()
+    
+    def _flush_metrics(self):
+        """Send every buffered custom metric in one batch"""
+        metrics, self._metric_buf = self._metric_buf, []
+        if metrics:
+            self.cloudwatch_client.put_metric_data_batch(metrics)
     
     def run_continuous_detection(self):
         """Run continuous anomaly detection"""
         logger.info("Starting continuous anomaly detection")
         
-        # Schedule periodic tasks
-        schedule.every(1).minutes.do(self._detection_cycle)
-        schedule.every(1).hours.do(self._retrain_cycle)
-        
         # Initial training
         self._initial_training()
         
+        # Periodic tasks run off monotonic deadlines; the loop sleeps until the nearest one
+        detection_interval = self.config['detection_interval']
+        retrain_interval = self.config['retrain_interval']
+        next_detection = time.monotonic() + detection_interval
+        next_retrain = time.monotonic() + retrain_interval
+        
         # Main loop
-        while True:
-            try:
-                schedule.run_pending()
-                time.sleep(10)  # Check every 10 seconds
-                
-            except KeyboardInterrupt:
-                logger.info("Stopping anomaly detection service")
-                break
-            except Exception as e:
-                logger.error(f"Error in main loop: {str(e)}")
-                time.sleep(30)  # Wait before retrying
+        try:
+            while True:
+                try:
+                    time.sleep(max(0.0, min(next_detection, next_retrain) - time.monotonic()))
+                    now = time.monotonic()
+                    
+                    if now >= next_detection:
+                        self._detection_cycle()
+                        next_detection += detection_interval
+                        if next_detection <= now:
+                            next_detection = now + detection_interval  # Overran; skip missed slots
+                    
+                    if now >= next_retrain:
+                        self._retrain_cycle()
+                        next_retrain += retrain_interval
+                        if next_retrain <= now:
+                            next_retrain = now + retrain_interval
+                    
+                except KeyboardInterrupt:
+                    logger.info("Stopping anomaly detection service")
+                    break
+                except Exception as e:
+                    logger.error(f"Error in main loop: {str(e)}")
+                    time.sleep(30)  # Wait before retrying
+        finally:
+            self._flush_metrics()  # Also on SIGTERM (raised as SystemExit by main)
     
     def _detection_cycle(self):
         """Single detection cycle"""
@@ -304,25 +589,29 @@ class AnomalyDetector:
             features = self.collect_and_process_data()
             
             if features:
-                # Add to training data
-                self.training_data.append(features)
+                # Add to training data (once trained, detection records the row itself)
+                if not self.is_trained:
+                    self.training_data.append(features)
                 
                 # Process and alert
                 self.process_and_alert(features)
-                
-                # Keep training data manageable
-                if len(self.training_data) > 10000:
-                    self.training_data = self.training_data[-5000:]
             
         except Exception as e:
             logger.error(f"Detection cycle failed: {str(e)}")
+        finally:
+            self._flush_metrics()  # Alarms evaluate per minute, so nothing waits past its cycle
     
     def _retrain_cycle(self):
         """Periodic model retraining"""
         try:
             logger.info("Starting scheduled model retraining")
             
-            if self.train_model(self.training_data):
+            if self.is_trained:
+                retrained = self._train_from_history()
+            else:
+                retrained = self.train_model(self.training_data)
+            
+            if retrained:
                 logger.info("Model retraining completed successfully")
             else:
                 logger.warning("Model retraining failed")
@@ -335,13 +624,24 @@ class AnomalyDetector:
         try:
             logger.info("Starting initial model training")
             
-            # Collect initial data
+            # Replay recent history as overlapping 5-minute windows (one per minute)
+            # instead of sampling it live, so detection starts without a warm-up wait
+            windows = self.cloudwatch_client.get_windowed_history(
+                window_minutes=5,
+                count=self.config['min_samples']
+            )
+            
+            # Extract every window in one batch so the per-metric statistics are vectorized across them
+            feature_batch = self.feature_extractor.extract_features_batch(
+                [metrics for metrics, _ in windows],
+                [logs for _, logs in windows]
+            )
+            
             initial_data = []
-            for _ in range(20):  # Collect 20 samples
-                features = self.collect_and_process_data()
+            for features in feature_batch:
+                features = self._prepare_features(features)
                 if features:
                     initial_data.append(features)
-                time.sleep(30)  # Wait 30 seconds between samples
             
             if initial_data:
                 if self.train_model(initial_data):
@@ -357,34 +657,87 @@ class AnomalyDetector:
     def _save_model(self):
         """Save the trained model"""
         try:
+            os.makedirs(MODEL_DIR, exist_ok=True)
+            
+            arrays = {name: getattr(self._forest, name) for name in _PackedForest.ARRAYS}
+            arrays['scaler_mean'] = self.scaler.mean_
+            arrays['scaler_inv_std'] = self.scaler.inv_std_
+            
+            # Replace files rather than rewrite them: other processes may have the old ones mapped
+            for name, array in arrays.items():
+                path = os.path.join(MODEL_DIR, f"{name}.npy")
+                with open(f"{path}.tmp", 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(f"{path}.tmp", path)
+            
             model_data = {
-                'model': self.model,
-                'scaler': self.scaler,
                 'config': self.config,
-                'feature_stats': getattr(self, 'feature_stats', {})
+                'feature_columns': list(self._feature_columns),
+                'offset': self._offset,
+                'max_depth': self._forest.max_depth,
+                'denominator': self._forest.denominator
             }
             
-            with open('/opt/smart-incident-predictor/data/anomaly_model.pkl', 'wb') as f:
-                pickle.dump(model_data, f)
+            path = os.path.join(MODEL_DIR, 'model.json')
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(model_data, f)
+            os.replace(f"{path}.tmp", path)
             
             logger.info("Model saved successfully")
+            return True
             
         except Exception as e:
             logger.error(f"Failed to save model: {str(e)}")
+            return False
     
     def _load_model(self):
-        """Load a saved model"""
+        """Load a saved model, memory-mapping its arrays so detector processes share the pages"""
         try:
-            with open('/opt/smart-incident-predictor/data/anomaly_model.pkl', 'rb') as f:
+            with open(os.path.join(MODEL_DIR, 'model.json')) as f:
+                model_data = json.load(f)
+            
+            def load(name):
+                return np.load(os.path.join(MODEL_DIR, f"{name}.npy"), mmap_mode='r')
+            
+            self._forest = _PackedForest(
+                **{name: load(name) for name in _PackedForest.ARRAYS},
+                max_depth=model_data['max_depth'],
+                denominator=model_data['denominator']
+            )
+            self.scaler = _FastScaler(load('scaler_mean'), load('scaler_inv_std'))
+            self._offset = model_data['offset']
+            self.config = {**self.config, **model_data.get('config', {})}  # Keys added since the save keep their defaults
+            self._set_feature_columns(model_data['feature_columns'])
+            self.is_trained = True
+            
+            logger.info("Model loaded successfully")
+            return True
+            
+        except FileNotFoundError:
+            return self._load_legacy_model()
+        except Exception as e:
+            logger.error(f"Failed to load model: {str(e)}")
+            return False
+    
+    def _load_legacy_model(self):
+        """Load a model pickled by older versions"""
+        try:
+            with open(LEGACY_MODEL_PATH, 'rb') as f:
                 model_data = pickle.load(f)
             
-            self.model = model_data['model']
+            model = model_data['model']
+            self._offset = float(model.offset_)
+            self._forest = _PackedForest.from_isolation_forest(model)
             self.scaler = model_data['scaler']
-            self.config = model_data.get('config', self.config)
-            self.feature_stats = model_data.get('feature_stats', {})
+            self.config = {**self.config, **model_data.get('config', {})}  # Keys added since the save keep their defaults
+            self._set_feature_columns(model_data.get(
+                'feature_columns', getattr(self.scaler, 'feature_names_in_', ())
+            ))
+            if not isinstance(self.scaler, _FastScaler):
+                self.scaler = _FastScaler.from_standard_scaler(self.scaler)
             self.is_trained = True
             
-            logger.info("Model loaded successfully")
+            logger.info("Legacy model loaded successfully")
             return True
             
         except FileNotFoundError:
@@ -398,12 +751,14 @@ def main():
     """Main entry point"""
     try:
         # Create data directory
-        import os
         os.makedirs('/opt/smart-incident-predictor/data', exist_ok=True)
         
         # Initialize detector
         detector = AnomalyDetector()
         
+        # systemd and docker stop with SIGTERM; exit through the loop's cleanup
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
         # Try to load existing model
         if not detector._load_model():
             logger.info("No existing model found, will train with new data")
@@ -4,19 +4,70 @@ Feature Extractor for Anomaly Detection
 Extracts meaningful features from system metrics and logs
 """
 
+import heapq
 import logging
 import re
+import time
+from bisect import bisect_right
+from itertools import accumulate
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-from collections import defaultdict, Counter
+from collections import Counter
+
+try:
+    import hyperscan
+except ImportError:  # Fall back to the combined re pattern
+    hyperscan = None
 
 logger = logging.getLogger(__name__)
 
+def _percentiles(arr: np.ndarray, percentiles) -> np.ndarray:
+    """np.percentile (linear method) for a finite 1-D array, selecting only the needed ranks with np.partition"""
+    q = np.asarray(percentiles, dtype=np.float64) / 100
+    virtual = (arr.size - 1) * q
+    below_idx = np.floor(virtual).astype(np.intp)
+    above_idx = np.minimum(below_idx + 1, arr.size - 1)
+    gamma = virtual - below_idx
+    
+    part = np.partition(arr, np.unique(np.concatenate((below_idx, above_idx))))
+    below, above = part[below_idx], part[above_idx]
+    
+    # Interpolate from whichever neighbour is nearer, exactly as NumPy does
+    diff = above - below
+    return np.where(gamma >= 0.5, above - diff * (1 - gamma), below + diff * gamma)
+
+# Metrics summarized by _extract_time_series_features, with their feature prefixes
+_SERIES_METRICS = (
+    ('cpu_utilization', 'cpu'),
+    ('memory_utilization', 'memory'),
+    ('disk_utilization', 'disk')
+)
+
 class FeatureExtractor:
     """Extracts features from metrics and logs for ML analysis"""
     
+    # Features reported when a window has no metrics / no logs (callers get copies)
+    _DEFAULT_METRIC_FEATURES = {
+        'cpu_current': 0,
+        'cpu_mean': 0,
+        'cpu_trend': 0,
+        'memory_current': 0,
+        'memory_mean': 0,
+        'disk_current': 0,
+        'system_stress_score': 0,
+        'anomaly_likelihood': 0
+    }
+    _DEFAULT_LOG_FEATURES = {
+        'log_count_total': 0,
+        'log_rate_per_minute': 0,
+        'log_error_ratio': 0,
+        'log_warning_ratio': 0,
+        'log_info_ratio': 0,
+        'error_types_count': 0,
+        'recent_error_spike': 0
+    }
+    
     def __init__(self):
         self.log_patterns = {
             'error': re.compile(r'\b(ERROR|FATAL|CRITICAL)\b', re.IGNORECASE),
@@ -28,6 +79,31 @@ class FeatureExtractor:
             'slow': re.compile(r'\b(slow|latency|delay)\b', re.IGNORECASE)
         }
         
+        # All patterns as one alternation, so each message is scanned once; lastgroup names the hit.
+        # When every pattern is \b(...)\b the boundaries are hoisted out and tested once per position
+        sources = {name: pattern.pattern for name, pattern in self.log_patterns.items()}
+        if all(source.startswith(r'\b') and source.endswith(r'\b') for source in sources.values()):
+            combined = r'\b(?:' + '|'.join(f'(?P<{name}>{source[2:-2]})' for name, source in sources.items()) + r')\b'
+        else:
+            combined = '|'.join(f'(?P<{name}>{source})' for name, source in sources.items())
+        self._combined_pattern = re.compile(combined, re.IGNORECASE)
+        
+        # With Hyperscan installed, one DFA scans all of a window's messages in a single call
+        self._pattern_names = tuple(self.log_patterns)
+        self._hs_db = None
+        if hyperscan is not None:
+            try:
+                db = hyperscan.Database()
+                db.compile(
+                    expressions=[pattern.pattern.encode() for pattern in self.log_patterns.values()],
+                    ids=list(range(len(self._pattern_names))),
+                    elements=len(self._pattern_names),
+                    flags=[hyperscan.HS_FLAG_CASELESS] * len(self._pattern_names)
+                )
+                self._hs_db = db
+            except Exception as e:
+                logger.warning(f"Hyperscan unavailable, using re for log patterns: {str(e)}")
+        
         # Feature configuration
         self.feature_config = {
             'time_windows': [60, 300, 900],  # 1min, 5min, 15min in seconds
@@ -37,11 +113,32 @@ class FeatureExtractor:
     
     def extract_features(self, metrics: Dict, logs: List[Dict]) -> Dict:
         """Extract comprehensive features from metrics and logs"""
+        return self._extract_window(metrics, logs)
+    
+    def extract_features_batch(self, metrics_list: List[Dict], logs_list: List[List[Dict]]) -> List[Dict]:
+        """Extract features for many windows, computing the time-series statistics across all of them at once"""
+        try:
+            arrays_list = [self._as_arrays(metrics) for metrics in metrics_list]
+            series_list = self._batch_time_series_features(arrays_list)
+        except Exception as e:
+            logger.error(f"Failed to batch time series features: {str(e)}")
+            return [self.extract_features(metrics, logs) for metrics, logs in zip(metrics_list, logs_list)]
+        
+        return [
+            self._extract_window(arrays, logs, series_features)
+            for arrays, logs, series_features in zip(arrays_list, logs_list, series_list)
+        ]
+    
+    def _extract_window(self, metrics: Dict, logs: List[Dict], series_features: Optional[Dict] = None) -> Dict:
+        """Extract one window's features (series_features: precomputed time-series stats by prefix)"""
         try:
             features = {}
             
+            # Every metric series becomes one float64 array, shared by all the extractors below
+            metrics = self._as_arrays(metrics)
+            
             # Extract metric features
-            metric_features = self._extract_metric_features(metrics)
+            metric_features = self._extract_metric_features(metrics, series_features)
             features.update(metric_features)
             
             # Extract log features
@@ -52,8 +149,8 @@ class FeatureExtractor:
             combined_features = self._extract_combined_features(metrics, logs)
             features.update(combined_features)
             
-            # Add timestamp
-            features['timestamp'] = datetime.utcnow().isoformat()
+            # Add timestamp (epoch ns, formatted only where a string is needed)
+            features['ts_ns'] = time.time_ns()
             
             logger.debug(f"Extracted {len(features)} features")
             return features
@@ -62,9 +159,19 @@ class FeatureExtractor:
             logger.error(f"Failed to extract features: {str(e)}")
             return {}
     
-    def _extract_metric_features(self, metrics: Dict) -> Dict:
+    def _as_arrays(self, metrics: Optional[Dict]) -> Dict:
+        """Copy of metrics with each list-valued series converted to a float64 ndarray"""
+        if not metrics:
+            return {}
+        return {
+            name: np.asarray(value, dtype=np.float64) if isinstance(value, list) else value
+            for name, value in metrics.items()
+        }
+    
+    def _extract_metric_features(self, metrics: Dict, series_features: Optional[Dict] = None) -> Dict:
         """Extract features from system metrics"""
         features = {}
+        series_features = series_features or {}
         
         try:
             if not metrics:
@@ -73,33 +180,33 @@ class FeatureExtractor:
             # CPU features
             if 'cpu_utilization' in metrics:
                 cpu_data = metrics['cpu_utilization']
-                features.update(self._extract_time_series_features(
+                features.update(series_features.get('cpu') or self._extract_time_series_features(
                     cpu_data, 'cpu'
                 ))
                 
                 # CPU-specific features
-                features['cpu_current'] = cpu_data[-1] if cpu_data else 0
+                features['cpu_current'] = cpu_data[-1] if len(cpu_data) else 0
                 features['cpu_trend'] = self._calculate_trend(cpu_data)
-                features['cpu_volatility'] = np.std(cpu_data) if len(cpu_data) > 1 else 0
+                features['cpu_volatility'] = cpu_data.std() if len(cpu_data) > 1 else 0
             
             # Memory features
             if 'memory_utilization' in metrics:
                 mem_data = metrics['memory_utilization']
-                features.update(self._extract_time_series_features(
+                features.update(series_features.get('memory') or self._extract_time_series_features(
                     mem_data, 'memory'
                 ))
                 
-                features['memory_current'] = mem_data[-1] if mem_data else 0
+                features['memory_current'] = mem_data[-1] if len(mem_data) else 0
                 features['memory_trend'] = self._calculate_trend(mem_data)
             
             # Disk features
             if 'disk_utilization' in metrics:
                 disk_data = metrics['disk_utilization']
-                features.update(self._extract_time_series_features(
+                features.update(series_features.get('disk') or self._extract_time_series_features(
                     disk_data, 'disk'
                 ))
                 
-                features['disk_current'] = disk_data[-1] if disk_data else 0
+                features['disk_current'] = disk_data[-1] if len(disk_data) else 0
             
             # Network features
             if 'network_io' in metrics:
@@ -139,10 +246,19 @@ class FeatureExtractor:
             features['log_count_total'] = len(logs)
             features['log_rate_per_minute'] = len(logs) / 5  # Assuming 5-minute window
             
-            # Log level distribution
-            log_levels = [log.get('level', 'INFO').upper() for log in logs]
-            level_counts = Counter(log_levels)
+            # Pull each field out once; the tallies below then run in C (Counter, one pattern scan)
+            levels = [log.get('level', 'INFO') for log in logs]
+            level_counts = Counter()
+            for level, count in Counter(levels).items():
+                level_counts[level.upper()] += count  # Case is folded once per distinct level, not per log
+            error_logs = [log for log, level in zip(logs, levels) if level == 'ERROR']
+            pattern_counts = self._pattern_counts([log.get('message', '') for log in logs])
+            response_times = [
+                rt for rt in (log.get('response_time_ms') for log in logs)
+                if rt and isinstance(rt, (int, float))
+            ]
             
+            # Log level distribution
             total_logs = len(logs)
             if total_logs > 0:
                 features['log_error_ratio'] = level_counts.get('ERROR', 0) / total_logs
@@ -153,14 +269,6 @@ class FeatureExtractor:
                 features['log_warning_ratio'] = 0
                 features['log_info_ratio'] = 0
             
-            # Pattern matching features
-            pattern_counts = defaultdict(int)
-            for log in logs:
-                message = log.get('message', '')
-                for pattern_name, pattern in self.log_patterns.items():
-                    if pattern.search(message):
-                        pattern_counts[pattern_name] += 1
-            
             # Pattern ratios
             if total_logs > 0:
                 for pattern_name in self.log_patterns.keys():
@@ -169,7 +277,6 @@ class FeatureExtractor:
                     )
             
             # Error pattern analysis
-            error_logs = [log for log in logs if log.get('level') == 'ERROR']
             if error_logs:
                 features['error_types_count'] = len(set(
                     log.get('error_type', 'unknown') for log in error_logs
@@ -177,16 +284,10 @@ class FeatureExtractor:
                 features['recent_error_spike'] = self._detect_error_spike(error_logs)
             
             # Response time from logs
-            response_times = []
-            for log in logs:
-                rt = log.get('response_time_ms')
-                if rt and isinstance(rt, (int, float)):
-                    response_times.append(rt)
-            
             if response_times:
-                features['log_response_time_avg'] = np.mean(response_times)
-                features['log_response_time_p95'] = np.percentile(response_times, 95)
-                features['log_response_time_max'] = np.max(response_times)
+                response_times = np.asarray(response_times, dtype=np.float64)
+                features['log_response_time_avg'] = response_times.mean()
+                features['log_response_time_p95'], features['log_response_time_max'] = _percentiles(response_times, (95, 100))
             else:
                 features['log_response_time_avg'] = 0
                 features['log_response_time_p95'] = 0
@@ -198,6 +299,27 @@ class FeatureExtractor:
         
         return features
     
+    def _pattern_counts(self, messages: List[str]) -> Counter:
+        """Number of messages matching each log pattern, from a single scan over all of them"""
+        # Messages are newline-joined (no pattern can match across a newline) and every
+        # match is mapped back to its message, so each message counts once per pattern
+        hits = set()
+        if self._hs_db is not None:
+            encoded = [message.encode() for message in messages]
+            ends = list(accumulate(len(message) + 1 for message in encoded))
+            self._hs_db.scan(
+                b'\n'.join(encoded),
+                match_event_handler=lambda pattern_id, start, end, *_: hits.add(
+                    (bisect_right(ends, end - 1), self._pattern_names[pattern_id])
+                )
+            )
+        else:
+            ends = list(accumulate(len(message) + 1 for message in messages))
+            for m in self._combined_pattern.finditer('\n'.join(messages)):
+                hits.add((bisect_right(ends, m.start()), m.lastgroup))
+        
+        return Counter(name for _, name in hits)
+    
     def _extract_combined_features(self, metrics: Dict, logs: List[Dict]) -> Dict:
         """Extract features that combine metrics and logs"""
         features = {}
@@ -209,8 +331,11 @@ class FeatureExtractor:
                 error_data = metrics['error_rate']
                 
                 if len(cpu_data) > 1 and len(error_data) > 1:
-                    correlation = np.corrcoef(cpu_data, error_data)[0, 1]
-                    features['cpu_error_correlation'] = correlation if not np.isnan(correlation) else 0
+                    # Pearson r directly; a constant series has no correlation
+                    xm = cpu_data - cpu_data.mean()
+                    ym = error_data - error_data.mean()
+                    denom = np.sqrt(np.dot(xm, xm) * np.dot(ym, ym))
+                    features['cpu_error_correlation'] = min(max(np.dot(xm, ym) / denom, -1.0), 1.0) if denom else 0
                 else:
                     features['cpu_error_correlation'] = 0
             
@@ -260,31 +385,32 @@ class FeatureExtractor:
         
         return features
     
-    def _extract_time_series_features(self, data: List[float], prefix: str) -> Dict:
+    def _extract_time_series_features(self, arr: np.ndarray, prefix: str) -> Dict:
         """Extract statistical features from time series data"""
         features = {}
         
-        if not data:
+        if not len(arr):
             return features
         
         try:
             # Basic statistics
-            features[f'{prefix}_mean'] = np.mean(data)
-            features[f'{prefix}_std'] = np.std(data)
-            features[f'{prefix}_min'] = np.min(data)
-            features[f'{prefix}_max'] = np.max(data)
+            features[f'{prefix}_mean'] = arr.mean()
+            features[f'{prefix}_std'] = arr.std()
+            features[f'{prefix}_min'] = arr.min()
+            features[f'{prefix}_max'] = arr.max()
             
-            # Percentiles
-            for p in self.feature_config['percentiles']:
-                features[f'{prefix}_p{p}'] = np.percentile(data, p)
+            # Percentiles (one partition for all of them)
+            percentiles = self.feature_config['percentiles']
+            for p, value in zip(percentiles, _percentiles(arr, percentiles)):
+                features[f'{prefix}_p{p}'] = value
             
             # Recent vs historical comparison
-            if len(data) >= 10:
-                recent_data = data[-5:]  # Last 5 points
-                historical_data = data[:-5]  # Everything before
+            if len(arr) >= 10:
+                recent_data = arr[-5:]  # Last 5 points
+                historical_data = arr[:-5]  # Everything before
                 
-                features[f'{prefix}_recent_avg'] = np.mean(recent_data)
-                features[f'{prefix}_historical_avg'] = np.mean(historical_data)
+                features[f'{prefix}_recent_avg'] = recent_data.mean()
+                features[f'{prefix}_historical_avg'] = historical_data.mean()
                 features[f'{prefix}_trend_ratio'] = (
                     features[f'{prefix}_recent_avg'] / 
                     max(features[f'{prefix}_historical_avg'], 1)
@@ -295,6 +421,43 @@ class FeatureExtractor:
         
         return features
     
+    def _batch_time_series_features(self, arrays_list: List[Dict]) -> List[Dict]:
+        """Time-series statistics for every window, one stacked matrix per metric and series length"""
+        series_list = [{} for _ in arrays_list]
+        percentiles = self.feature_config['percentiles']
+        
+        for metric, prefix in _SERIES_METRICS:
+            # Windows holding this series, grouped by its length so each group stacks without padding
+            groups = {}
+            for i, arrays in enumerate(arrays_list):
+                data = arrays.get(metric)
+                if isinstance(data, np.ndarray) and data.ndim == 1 and len(data):
+                    groups.setdefault(len(data), []).append(i)
+            
+            for length, indices in groups.items():
+                matrix = np.vstack([arrays_list[i][metric] for i in indices])
+                
+                # Same statistics and order as _extract_time_series_features, one row per window
+                stats = {
+                    f'{prefix}_mean': matrix.mean(axis=1),
+                    f'{prefix}_std': matrix.std(axis=1),
+                    f'{prefix}_min': matrix.min(axis=1),
+                    f'{prefix}_max': matrix.max(axis=1)
+                }
+                for p, values in zip(percentiles, np.percentile(matrix, percentiles, axis=1)):
+                    stats[f'{prefix}_p{p}'] = values
+                if length >= 10:
+                    recent_avg = matrix[:, -5:].mean(axis=1)
+                    historical_avg = matrix[:, :-5].mean(axis=1)
+                    stats[f'{prefix}_recent_avg'] = recent_avg
+                    stats[f'{prefix}_historical_avg'] = historical_avg
+                    stats[f'{prefix}_trend_ratio'] = recent_avg / np.maximum(historical_avg, 1)
+                
+                for row, i in enumerate(indices):
+                    series_list[i][prefix] = {name: values[row] for name, values in stats.items()}
+        
+        return series_list
+    
     def _extract_network_features(self, net_data: Dict) -> Dict:
         """Extract network-related features"""
         features = {}
@@ -318,20 +481,20 @@ class FeatureExtractor:
         
         return features
     
-    def _extract_request_features(self, req_data: List[float]) -> Dict:
+    def _extract_request_features(self, req_data: np.ndarray) -> Dict:
         """Extract request-related features"""
         features = {}
         
         try:
-            if req_data:
-                features['requests_current'] = req_data[-1] if req_data else 0
-                features['requests_avg'] = np.mean(req_data)
-                features['requests_peak'] = np.max(req_data)
+            if len(req_data):
+                features['requests_current'] = req_data[-1]
+                features['requests_avg'] = req_data.mean()
+                features['requests_peak'] = req_data.max()
                 
                 # Request trend
                 if len(req_data) >= 5:
-                    recent = np.mean(req_data[-3:])
-                    historical = np.mean(req_data[:-3])
+                    recent = req_data[-3:].mean()
+                    historical = req_data[:-3].mean()
                     features['requests_trend'] = recent / max(historical, 1)
         
         except Exception as e:
@@ -339,41 +502,41 @@ class FeatureExtractor:
         
         return features
     
-    def _extract_response_time_features(self, rt_data: List[float]) -> Dict:
+    def _extract_response_time_features(self, rt_data: np.ndarray) -> Dict:
         """Extract response time features"""
         features = {}
         
         try:
-            if rt_data:
-                features['response_time_current'] = rt_data[-1] if rt_data else 0
-                features['response_time_avg'] = np.mean(rt_data)
-                features['response_time_p95'] = np.percentile(rt_data, 95)
-                features['response_time_max'] = np.max(rt_data)
+            if len(rt_data):
+                features['response_time_current'] = rt_data[-1]
+                features['response_time_avg'] = rt_data.mean()
+                
+                # p95 and the maximum (p100) from one selection pass
+                features['response_time_p95'], features['response_time_max'] = _percentiles(rt_data, (95, 100))
                 
                 # Slow request ratio
                 slow_threshold = 1000  # 1 second
-                slow_requests = sum(1 for rt in rt_data if rt > slow_threshold)
-                features['slow_requests_ratio'] = slow_requests / len(rt_data)
+                features['slow_requests_ratio'] = np.count_nonzero(rt_data > slow_threshold) / rt_data.size
         
         except Exception as e:
             logger.error(f"Failed to extract response time features: {str(e)}")
         
         return features
     
-    def _extract_error_rate_features(self, error_data: List[float]) -> Dict:
+    def _extract_error_rate_features(self, error_data: np.ndarray) -> Dict:
         """Extract error rate features"""
         features = {}
         
         try:
-            if error_data:
-                features['error_rate_current'] = error_data[-1] if error_data else 0
-                features['error_rate_avg'] = np.mean(error_data)
-                features['error_rate_max'] = np.max(error_data)
+            if len(error_data):
+                features['error_rate_current'] = error_data[-1]
+                features['error_rate_avg'] = error_data.mean()
+                features['error_rate_max'] = error_data.max()
                 
                 # Error spike detection
                 if len(error_data) >= 3:
-                    recent_avg = np.mean(error_data[-3:])
-                    historical_avg = np.mean(error_data[:-3])
+                    recent_avg = error_data[-3:].mean()
+                    historical_avg = error_data[:-3].mean()
                     features['error_spike_ratio'] = recent_avg / max(historical_avg, 0.1)
         
         except Exception as e:
@@ -381,17 +544,17 @@ class FeatureExtractor:
         
         return features
     
-    def _calculate_trend(self, data: List[float]) -> float:
+    def _calculate_trend(self, y: np.ndarray) -> float:
         """Calculate linear trend of time series"""
         try:
-            if len(data) < 2:
+            n = len(y)
+            if n < 2:
                 return 0
             
-            x = np.arange(len(data))
-            y = np.array(data)
-            
-            # Simple linear regression
-            slope = np.polyfit(x, y, 1)[0]
+            # Simple linear regression against 0..n-1, closed form (the slope np.polyfit would fit)
+            sx = n * (n - 1) / 2
+            sxx = n * (n - 1) * (2 * n - 1) / 6
+            slope = (n * np.dot(np.arange(n), y) - sx * y.sum()) / (n * sxx - sx * sx)
             return slope
         
         except Exception:
@@ -403,22 +566,17 @@ class FeatureExtractor:
             if len(error_logs) < 2:
                 return 0
             
-            # Group errors by minute
-            error_counts = defaultdict(int)
-            for log in error_logs:
-                timestamp = log.get('timestamp', '')
-                if timestamp:
-                    # Extract minute from timestamp
-                    minute_key = timestamp[:16]  # YYYY-MM-DDTHH:MM
-                    error_counts[minute_key] += 1
+            # Group errors by minute (YYYY-MM-DDTHH:MM prefix of the timestamp)
+            timestamps = (log.get('timestamp', '') for log in error_logs)
+            error_counts = Counter(timestamp[:16] for timestamp in timestamps if timestamp)
             
             if len(error_counts) < 2:
                 return 0
             
-            # Compare recent minute to previous minute
-            minutes = sorted(error_counts.keys())
-            recent_count = error_counts[minutes[-1]]
-            previous_count = error_counts[minutes[-2]] if len(minutes) > 1 else 1
+            # Compare recent minute to previous minute; only the two latest keys are needed, not a full sort
+            recent_minute, previous_minute = heapq.nlargest(2, error_counts)
+            recent_count = error_counts[recent_minute]
+            previous_count = error_counts[previous_minute]
             
             spike_ratio = recent_count / max(previous_count, 1)
             return min(spike_ratio, 10)  # Cap at 10x
@@ -428,25 +586,8 @@ class FeatureExtractor:
     
     def _get_default_metric_features(self) -> Dict:
         """Return default metric features when no data available"""
-        return {
-            'cpu_current': 0,
-            'cpu_mean': 0,
-            'cpu_trend': 0,
-            'memory_current': 0,
-            'memory_mean': 0,
-            'disk_current': 0,
-            'system_stress_score': 0,
-            'anomaly_likelihood': 0
-        }
+        return dict(self._DEFAULT_METRIC_FEATURES)
     
     def _get_default_log_features(self) -> Dict:
         """Return default log features when no data available"""
-        return {
-            'log_count_total': 0,
-            'log_rate_per_minute': 0,
-            'log_error_ratio': 0,
-            'log_warning_ratio': 0,
-            'log_info_ratio': 0,
-            'error_types_count': 0,
-            'recent_error_spike': 0
-        }
+        return dict(self._DEFAULT_LOG_FEATURES)
@@ -58,7 +58,7 @@ class OptimizedAnomalyDetector:
         # Data management (memory optimized)
         self.training_data = []
         self.feature_buffer = []
-        self.max_training_samples = self.ml_config.max_samples
+        self.max_training_samples = self.ml_config.max_training_samples
         self.max_buffer_size = 100
         
         # Feature selection (optimized for t2.micro)
@@ -517,6 +517,8 @@ class OptimizedAnomalyDetector:
                     'timestamp': datetime.utcnow().isoformat()
                 }
                 self.alert_manager.send_alert(alert_data)
+            else:
+                self.alert_manager.record_normal()
             
             # Publish custom metric
             if config.is_aws_ec2():
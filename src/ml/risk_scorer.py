@@ -5,12 +5,51 @@ Calculates incident risk scores based on anomaly detection results
 """
 
 import logging
+import time
+import functools
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Sequence
 
 logger = logging.getLogger(__name__)
 
+def _ladders(*rows):
+    return tuple((key, np.asarray(thresholds, dtype=np.float64), np.asarray(points, dtype=np.float64))
+                 for key, thresholds, points in rows)
+
+# (feature, thresholds, points): a value above thresholds[i] (and no higher one) earns points[i + 1]
+_STRESS_LADDERS = _ladders(
+    ('cpu_current', (50, 70, 80, 90), (0, 25, 50, 75, 100)),
+    ('memory_current', (60, 75, 85, 95), (0, 25, 50, 75, 100)),
+    ('disk_current', (75, 85, 95), (0, 50, 75, 100)),
+)
+_ERROR_LADDERS = _ladders(
+    ('log_error_ratio', (0.01, 0.05, 0.1, 0.2), (0, 20, 40, 60, 80)),  # Base error rate
+    ('recent_error_spike', (2, 3, 5), (0, 15, 25, 40)),  # 2x/3x/5x increase
+    ('error_types_count', (1, 3, 5), (0, 5, 10, 20)),  # Error diversity
+)
+_PERFORMANCE_LADDERS = _ladders(
+    ('response_time_current', (500, 1000, 2000, 5000), (0, 20, 40, 60, 80)),
+    ('response_time_p95', (800, 1500, 3000), (0, 20, 40, 60)),
+    ('log_response_time_p95', (500, 1000, 2000), (0, 10, 25, 40)),
+    ('slow_requests_ratio', (0.05, 0.1, 0.2), (0, 15, 30, 50)),
+)
+
+# Every feature the score reads, with the value assumed when it is absent
+_DEFAULTS = {key: 0 for ladders in (_STRESS_LADDERS, _ERROR_LADDERS, _PERFORMANCE_LADDERS) for key, _, _ in ladders}
+_DEFAULTS.update({
+    'recent_error_spike': 1,
+    'system_stress_score': 0,
+    'log_pattern_connection_ratio': 0,
+    'log_pattern_database_ratio': 0
+})
+
+@functools.lru_cache(maxsize=8)
+def _column_index(feature_columns: tuple) -> Dict[str, int]:
+    """Position of each scored feature among the detector's columns"""
+    return {key: i for i, key in enumerate(feature_columns) if key in _DEFAULTS}
+
 class RiskScorer:
     """Calculates risk scores for detected anomalies"""
     
@@ -36,286 +75,133 @@ class RiskScorer:
             }
         }
         
-        # Historical context
-        self.prediction_history = []
+        # Historical context (bounded; the oldest entries fall off)
+        self.prediction_history = deque(maxlen=1000)
+        self._recent_scores = deque(maxlen=10)
         self.baseline_metrics = {}
         
         logger.info("Risk Scorer initialized")
     
     def calculate_risk_score(self, anomaly_score: float, features: Dict) -> float:
         """Calculate comprehensive risk score"""
+        return self.calculate_risk_scores([anomaly_score], None, (), [features])[0]
+    
+    def calculate_risk_scores(self, anomaly_scores: Sequence[float], X: Optional[np.ndarray],
+                              feature_columns: Sequence[str],
+                              feature_batch: Optional[Sequence[Dict]] = None) -> List[float]:
+        """Risk scores for a batch, one per row of X (raw values in feature_columns order)
+        
+        Scored features missing from the columns are read from feature_batch when given
+        """
         try:
-            # Normalize anomaly score (-1 to 1) to (0 to 100)
-            normalized_anomaly_score = self._normalize_anomaly_score(anomaly_score)
+            n = len(anomaly_scores)
+            index = _column_index(tuple(feature_columns))
+            
+            def column(key):
+                if key in index:
+                    return X[:, index[key]]
+                default = _DEFAULTS[key]
+                if feature_batch is None:
+                    return np.full(n, default)
+                values = (features.get(key) for features in feature_batch)
+                return np.fromiter((default if v is None else v for v in values), dtype=np.float64, count=n)
+            
+            def above(values, threshold):
+                return values > values.dtype.type(threshold)
+            
+            def ladder_score(ladders):
+                # Each ladder awards the points of the highest threshold the feature exceeds
+                score = np.zeros(n)
+                for key, thresholds, points in ladders:
+                    values = column(key)
+                    score += points[np.searchsorted(thresholds.astype(values.dtype), values, side='left')]
+                return score
+            
+            # Normalize anomaly score (-1 to 1) to (0 to 100); IsolationForest is negative for anomalies
+            anomaly_scores = np.asarray(anomaly_scores, dtype=np.float64)
+            normalized_anomaly_score = np.where(
+                anomaly_scores < 0,
+                np.minimum(100, 50 + np.abs(anomaly_scores) * 50),
+                np.maximum(0, 50 - anomaly_scores * 50)
+            )
             
-            # Calculate component scores
-            system_stress_score = self._calculate_system_stress_score(features)
-            error_rate_score = self._calculate_error_rate_score(features)
-            performance_score = self._calculate_performance_score(features)
+            # Component scores
+            system_stress_score = (ladder_score(_STRESS_LADDERS) + column('system_stress_score') * 100) / 4
+            error_rate_score = np.minimum(100, ladder_score(_ERROR_LADDERS))
+            performance_score = np.minimum(100, ladder_score(_PERFORMANCE_LADDERS))
             
             # Calculate weighted risk score
-            risk_score = (
-                normalized_anomaly_score * self.risk_config['weights']['anomaly_score'] +
-                system_stress_score * self.risk_config['weights']['system_stress'] +
-                error_rate_score * self.risk_config['weights']['error_rate'] +
-                performance_score * self.risk_config['weights']['performance']
+            weights = self.risk_config['weights']
+            risk_scores = (
+                normalized_anomaly_score * weights['anomaly_score'] +
+                system_stress_score * weights['system_stress'] +
+                error_rate_score * weights['error_rate'] +
+                performance_score * weights['performance']
             )
             
             # Apply severity multipliers
-            risk_score = self._apply_severity_multipliers(risk_score, features)
-            
-            # Apply temporal context
-            risk_score = self._apply_temporal_context(risk_score)
-            
-            # Ensure score is within bounds
-            risk_score = max(0, min(100, risk_score))
-            
-            # Store for historical context
-            self._store_prediction(risk_score, features)
+            multipliers = self.risk_config['severity_multipliers']
+            critical = above(column('cpu_current'), 95) | above(column('memory_current'), 98)
+            risk_scores = risk_scores * np.where(critical, multipliers['critical_system'], 1.0)
+            for key, threshold in (('log_pattern_connection_ratio', 0.1), ('log_pattern_database_ratio', 0.05)):
+                risk_scores = risk_scores * np.where(above(column(key), threshold), multipliers['customer_facing'], 1.0)
+            
+            # Temporal context depends on the scores before it, so it runs row by row
+            hour_factor = self._hour_factor()
+            results = []
+            for risk_score in risk_scores.tolist():
+                risk_score = self._apply_temporal_context(risk_score) * hour_factor
+                
+                # Ensure score is within bounds
+                risk_score = max(0, min(100, risk_score))
+                
+                # Store for historical context
+                self._store_prediction(risk_score)
+                results.append(round(risk_score, 2))
             
-            return round(risk_score, 2)
+            return results
             
         except Exception as e:
             logger.error(f"Failed to calculate risk score: {str(e)}")
-            return 0.0
-    
-    def _normalize_anomaly_score(self, anomaly_score: float) -> float:
-        """Normalize ML anomaly score to 0-100 scale"""
-        # Isolation Forest returns: negative for anomalies, positive for normal
-        # Convert to 0-100 where higher is more anomalous
-        if anomaly_score < 0:
-            # Anomaly detected, map to 50-100 range
-            return min(100, 50 + abs(anomaly_score) * 50)
-        else:
-            # Normal, map to 0-50 range
-            return max(0, 50 - anomaly_score * 50)
-    
-    def _calculate_system_stress_score(self, features: Dict) -> float:
-        """Calculate system stress component score"""
-        try:
-            stress_indicators = []
-            
-            # CPU stress
-            cpu_current = features.get('cpu_current', 0)
-            if cpu_current > 90:
-                stress_indicators.append(100)
-            elif cpu_current > 80:
-                stress_indicators.append(75)
-            elif cpu_current > 70:
-                stress_indicators.append(50)
-            elif cpu_current > 50:
-                stress_indicators.append(25)
-            else:
-                stress_indicators.append(0)
-            
-            # Memory stress
-            memory_current = features.get('memory_current', 0)
-            if memory_current > 95:
-                stress_indicators.append(100)
-            elif memory_current > 85:
-                stress_indicators.append(75)
-            elif memory_current > 75:
-                stress_indicators.append(50)
-            elif memory_current > 60:
-                stress_indicators.append(25)
-            else:
-                stress_indicators.append(0)
-            
-            # Disk stress
-            disk_current = features.get('disk_current', 0)
-            if disk_current > 95:
-                stress_indicators.append(100)
-            elif disk_current > 85:
-                stress_indicators.append(75)
-            elif disk_current > 75:
-                stress_indicators.append(50)
-            else:
-                stress_indicators.append(0)
-            
-            # System stress score (if available)
-            system_stress = features.get('system_stress_score', 0)
-            stress_indicators.append(system_stress * 100)
-            
-            return np.mean(stress_indicators)
-            
-        except Exception as e:
-            logger.error(f"Failed to calculate system stress score: {str(e)}")
-            return 0.0
-    
-    def _calculate_error_rate_score(self, float) -> float:
-        """Calculate error rate component score"""
-        try:
-            # Log error ratio
-            log_error_ratio = features.get('log_error_ratio', 0)
-            
-            # Error spike detection
-            error_spike = features.get('recent_error_spike', 1)
-            
-            # Error types diversity
-            error_types = features.get('error_types_count', 0)
-            
-            # Calculate error score
-            error_score = 0
-            
-            # Base error rate score
-            if log_error_ratio > 0.2:  # >20% errors
-                error_score += 80
-            elif log_error_ratio > 0.1:  # >10% errors
-                error_score += 60
-            elif log_error_ratio > 0.05:  # >5% errors
-                error_score += 40
-            elif log_error_ratio > 0.01:  # >1% errors
-                error_score += 20
-            
-            # Error spike penalty
-            if error_spike > 5:  # 5x increase
-                error_score += 40
-            elif error_spike > 3:  # 3x increase
-                error_score += 25
-            elif error_spike > 2:  # 2x increase
-                error_score += 15
-            
-            # Error diversity penalty
-            if error_types > 5:
-                error_score += 20
-            elif error_types > 3:
-                error_score += 10
-            elif error_types > 1:
-                error_score += 5
-            
-            return min(100, error_score)
-            
-        except Exception as e:
-            logger.error(f"Failed to calculate error rate score: {str(e)}")
-            return 0.0
-    
-    def _calculate_performance_score(self, features: Dict) -> float:
-        """Calculate performance degradation score"""
-        try:
-            performance_score = 0
-            
-            # Response time metrics
-            response_time_current = features.get('response_time_current', 0)
-            response_time_p95 = features.get('response_time_p95', 0)
-            log_response_time_p95 = features.get('log_response_time_p95', 0)
-            
-            # Current response time
-            if response_time_current > 5000:  # >5 seconds
-                performance_score += 80
-            elif response_time_current > 2000:  # >2 seconds
-                performance_score += 60
-            elif response_time_current > 1000:  # >1 second
-                performance_score += 40
-            elif response_time_current > 500:  # >500ms
-                performance_score += 20
-            
-            # P95 response time
-            if response_time_p95 > 3000:
-                performance_score += 60
-            elif response_time_p95 > 1500:
-                performance_score += 40
-            elif response_time_p95 > 800:
-                performance_score += 20
-            
-            # Log-based response time
-            if log_response_time_p95 > 2000:
-                performance_score += 40
-            elif log_response_time_p95 > 1000:
-                performance_score += 25
-            elif log_response_time_p95 > 500:
-                performance_score += 10
-            
-            # Slow requests ratio
-            slow_requests_ratio = features.get('slow_requests_ratio', 0)
-            if slow_requests_ratio > 0.2:  # >20% slow requests
-                performance_score += 50
-            elif slow_requests_ratio > 0.1:  # >10% slow requests
-                performance_score += 30
-            elif slow_requests_ratio > 0.05:  # >5% slow requests
-                performance_score += 15
-            
-            return min(100, performance_score)
-            
-        except Exception as e:
-            logger.error(f"Failed to calculate performance score: {str(e)}")
-            return 0.0
-    
-    def _apply_severity_multipliers(self, risk_score: float, features: Dict) -> float:
-        """Apply severity multipliers based on affected components"""
-        try:
-            multiplier = 1.0
-            
-            # Check for critical system indicators
-            if features.get('cpu_current', 0) > 95 or features.get('memory_current', 0) > 98:
-                multiplier *= self.risk_config['severity_multipliers']['critical_system']
-            
-            # Check for customer-facing impact
-            error_patterns = features.get('log_pattern_connection_ratio', 0)
-            if error_patterns > 0.1:  # High connection errors
-                multiplier *= self.risk_config['severity_multipliers']['customer_facing']
-            
-            # Check for database issues
-            db_patterns = features.get('log_pattern_database_ratio', 0)
-            if db_patterns > 0.05:  # Database errors
-                multiplier *= self.risk_config['severity_multipliers']['customer_facing']
-            
-            return risk_score * multiplier
-            
-        except Exception as e:
-            logger.error(f"Failed to apply severity multipliers: {str(e)}")
-            return risk_score
+            return [0.0] * len(anomaly_scores)
     
     def _apply_temporal_context(self, risk_score: float) -> float:
-        """Apply temporal context to risk score"""
-        try:
-            # Check if this is part of a pattern
-            recent_predictions = self.prediction_history[-10:]  # Last 10 predictions
-            
-            if len(recent_predictions) >= 3:
-                recent_scores = [p['risk_score'] for p in recent_predictions]
-                
-                # Increasing trend
-                if len(recent_scores) >= 3:
-                    trend = np.polyfit(range(len(recent_scores)), recent_scores, 1)[0]
-                    if trend > 5:  # Increasing trend
-                        risk_score *= 1.2
-                    elif trend < -5:  # Decreasing trend
-                        risk_score *= 0.9
-                
-                # Sustained high risk
-                if np.mean(recent_scores[-3:]) > 60:
-                    risk_score *= 1.1
-            
-            # Time of day considerations
-            current_hour = datetime.now().hour
-            if 2 <= current_hour <= 5:  # Off-peak hours
-                risk_score *= 1.1  # Issues during off-peak are more concerning
-            elif 9 <= current_hour <= 17:  # Business hours
-                risk_score *= 1.05  # Slightly higher impact during business hours
-            
-            return risk_score
-            
-        except Exception as e:
-            logger.error(f"Failed to apply temporal context: {str(e)}")
-            return risk_score
+        """Apply the recent-trend part of the temporal context to risk score"""
+        recent_scores = self._recent_scores  # Last 10 predictions
+        n = len(recent_scores)
+        
+        if n >= 3:
+            # Least-squares slope over 0..n-1 (what np.polyfit(..., 1) computes)
+            x_mean = (n - 1) / 2
+            y_mean = sum(recent_scores) / n
+            trend = sum((i - x_mean) * (y - y_mean) for i, y in enumerate(recent_scores)) / (n * (n * n - 1) / 12)
+            if trend > 5:  # Increasing trend
+                risk_score *= 1.2
+            elif trend < -5:  # Decreasing trend
+                risk_score *= 0.9
+            
+            # Sustained high risk
+            if (recent_scores[-1] + recent_scores[-2] + recent_scores[-3]) / 3 > 60:
+                risk_score *= 1.1
+        
+        return risk_score
+    
+    def _hour_factor(self) -> float:
+        """Time of day considerations"""
+        current_hour = datetime.now().hour
+        if 2 <= current_hour <= 5:  # Off-peak hours
+            return 1.1  # Issues during off-peak are more concerning
+        elif 9 <= current_hour <= 17:  # Business hours
+            return 1.05  # Slightly higher impact during business hours
+        return 1.0
     
-    def _store_prediction(self, risk_score: float, features: Dict):
+    def _store_prediction(self, risk_score: float):
         """Store prediction for historical context"""
-        try:
-            prediction = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'risk_score': risk_score,
-                'features': features
-            }
-            
-            self.prediction_history.append(prediction)
-            
-            # Keep only last 1000 predictions
-            if len(self.prediction_history) > 1000:
-                self.prediction_history = self.prediction_history[-1000:]
-                
-        except Exception as e:
-            logger.error(f"Failed to store prediction: {str(e)}")
+        self._recent_scores.append(risk_score)
+        self.prediction_history.append({
+            'ts_ns': time.time_ns(),
+            'risk_score': risk_score
+        })
     
     def get_risk_level(self, risk_score: float) -> str:
         """Get risk level classification"""
@@ -8,8 +8,10 @@ import logging
 import boto3
 import json
 import re
+import time
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -40,101 +42,16 @@ class CloudWatchClient:
             
             metrics = {}
             
-            # Define metrics to collect
-            metric_queries = [
-                # CPU Utilization
-                {
-                    'Id': 'cpu_utilization',
-                    'Label': 'CPUUtilization',
-                    'MetricStat': {
-                        'Metric': {
-                            'Namespace': 'AWS/EC2',
-                            'MetricName': 'CPUUtilization',
-                            'Dimensions': [
-                                {'Name': 'InstanceId', 'Value': self.config['instance_id']}
-                            ]
-                        },
-                        'Period': 60,  # 1 minute
-                        'Stat': 'Average'
-                    }
-                },
-                # Memory Utilization (custom metric)
-                {
-                    'Id': 'memory_utilization',
-                    'Label': 'MemoryUtilization',
-                    'MetricStat': {
-                        'Metric': {
-                            'Namespace': 'System/Linux',
-                            'MetricName': 'MemoryUtilization',
-                            'Dimensions': [
-                                {'Name': 'InstanceId', 'Value': self.config['instance_id']}
-                            ]
-                        },
-                        'Period': 60,
-                        'Stat': 'Average'
-                    }
-                },
-                # Disk Utilization
-                {
-                    'Id': 'disk_utilization',
-                    'Label': 'DiskSpaceUtilization',
-                    'MetricStat': {
-                        'Metric': {
-                            'Namespace': 'System/Linux',
-                            'MetricName': 'DiskSpaceUtilization',
-                            'Dimensions': [
-                                {'Name': 'InstanceId', 'Value': self.config['instance_id']},
-                                {'Name': 'Path', 'Value': '/'}
-                            ]
-                        },
-                        'Period': 60,
-                        'Stat': 'Average'
-                    }
-                },
-                # Network In
-                {
-                    'Id': 'network_in',
-                    'Label': 'NetworkIn',
-                    'MetricStat': {
-                        'Metric': {
-                            'Namespace': 'AWS/EC2',
-                            'MetricName': 'NetworkIn',
-                            'Dimensions': [
-                                {'Name': 'InstanceId', 'Value': self.config['instance_id']}
-                            ]
-                        },
-                        'Period': 60,
-                        'Stat': 'Sum'
-                    }
-                },
-                # Network Out
-                {
-                    'Id': 'network_out',
-                    'Label': 'NetworkOut',
-                    'MetricStat': {
-                        'Metric': {
-                            'Namespace': 'AWS/EC2',
-                            'MetricName': 'NetworkOut',
-                            'Dimensions': [
-                                {'Name': 'InstanceId', 'Value': self.config['instance_id']}
-                            ]
-                        },
-                        'Period': 60,
-                        'Stat': 'Sum'
-                    }
-                }
-            ]
-            
             # Get metrics
             response = self.cloudwatch.get_metric_data(
-                MetricDataQueries=metric_queries,
+                MetricDataQueries=self._metric_queries(),
                 StartTime=start_time,
                 EndTime=end_time
             )
             
             # Process results
             for result in response['MetricDataResults']:
-                metric_name = result['Label'].lower().replace(' ', '_')
+                metric_name = self._metric_key(result)
                 values = result['Values']
                 
                 if values:
@@ -153,6 +70,158 @@ class CloudWatchClient:
             logger.error(f"Failed to get metrics from CloudWatch: {str(e)}")
             return self._get_fallback_metrics(window_minutes)
     
+    def _metric_queries(self) -> List[Dict]:
+        """GetMetricData queries for the instance metrics the detector uses"""
+        # Define metrics to collect
+        return [
+            # CPU Utilization
+            {
+                'Id': 'cpu_utilization',
+                'Label': 'CPUUtilization',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/EC2',
+                        'MetricName': 'CPUUtilization',
+                        'Dimensions': [
+                            {'Name': 'InstanceId', 'Value': self.config['instance_id']}
+                        ]
+                    },
+                    'Period': 60,  # 1 minute
+                    'Stat': 'Average'
+                }
+            },
+            # Memory Utilization (custom metric)
+            {
+                'Id': 'memory_utilization',
+                'Label': 'MemoryUtilization',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'System/Linux',
+                        'MetricName': 'MemoryUtilization',
+                        'Dimensions': [
+                            {'Name': 'InstanceId', 'Value': self.config['instance_id']}
+                        ]
+                    },
+                    'Period': 60,
+                    'Stat': 'Average'
+                }
+            },
+            # Disk Utilization
+            {
+                'Id': 'disk_utilization',
+                'Label': 'DiskSpaceUtilization',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'System/Linux',
+                        'MetricName': 'DiskSpaceUtilization',
+                        'Dimensions': [
+                            {'Name': 'InstanceId', 'Value': self.config['instance_id']},
+                            {'Name': 'Path', 'Value': '/'}
+                        ]
+                    },
+                    'Period': 60,
+                    'Stat': 'Average'
+                }
+            },
+            # Network In
+            {
+                'Id': 'network_in',
+                'Label': 'NetworkIn',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/EC2',
+                        'MetricName': 'NetworkIn',
+                        'Dimensions': [
+                            {'Name': 'InstanceId', 'Value': self.config['instance_id']}
+                        ]
+                    },
+                    'Period': 60,
+                    'Stat': 'Sum'
+                }
+            },
+            # Network Out
+            {
+                'Id': 'network_out',
+                'Label': 'NetworkOut',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/EC2',
+                        'MetricName': 'NetworkOut',
+                        'Dimensions': [
+                            {'Name': 'InstanceId', 'Value': self.config['instance_id']}
+                        ]
+                    },
+                    'Period': 60,
+                    'Stat': 'Sum'
+                }
+            }
+        ]
+    
+    def _metric_key(self, result: Dict) -> str:
+        """Key a GetMetricData result is stored under"""
+        return result['Label'].lower().replace(' ', '_')
+    
+    def get_windowed_history(self, window_minutes: int = 5, count: int = 20,
+                             step_minutes: int = 1) -> List[Tuple[Dict, List[Dict]]]:
+        """Fetch recent history once and cut it into (metrics, logs) windows, oldest first"""
+        end_ts = time.time()
+        span_minutes = window_minutes + (count - 1) * step_minutes
+        end_time = datetime.utcfromtimestamp(end_ts)
+        start_time = end_time - timedelta(minutes=span_minutes)
+        
+        # Window k ends k steps before now and covers the window_minutes before that
+        bounds = [
+            (end_ts - (k * step_minutes + window_minutes) * 60, end_ts - k * step_minutes * 60)
+            for k in reversed(range(count))
+        ]
+        
+        # One GetMetricData call for the whole span, ascending so windows are bisectable
+        series = {}
+        try:
+            response = self.cloudwatch.get_metric_data(
+                MetricDataQueries=self._metric_queries(),
+                StartTime=start_time,
+                EndTime=end_time,
+                ScanBy='TimestampAscending'
+            )
+            for result in response['MetricDataResults']:
+                series[self._metric_key(result)] = (
+                    [ts.timestamp() for ts in result['Timestamps']], result['Values']
+                )
+        except Exception as e:
+            logger.error(f"Failed to get metric history from CloudWatch: {str(e)}")
+        
+        # One read per log group for the whole span; events are bucketed by their own timestamps
+        events = []
+        for log_group_name in self.config['log_group_names']:
+            events.extend(self._get_log_events_from_group(
+                log_group_name, start_time, end_time, limit=10000
+            ))
+        events.sort(key=lambda event: event['timestamp'])
+        log_times = [event['timestamp'] / 1000 for event in events]
+        parsed_logs = [self._parse_log_entry(event['message']) for event in events]
+        
+        windows = []
+        for lo, hi in bounds:
+            if series:
+                metrics = {}
+                for metric_name, (times, values) in series.items():
+                    # Newest first, like get_recent_metrics
+                    window_values = values[bisect_right(times, lo):bisect_right(times, hi)][::-1]
+                    metrics[metric_name] = window_values or self._simulate_metric_data(metric_name, window_minutes)
+                metrics.update(self._calculate_derived_metrics(metrics))
+            else:
+                metrics = self._get_fallback_metrics(window_minutes)
+            
+            logs = [
+                parsed for parsed in parsed_logs[bisect_right(log_times, lo):bisect_right(log_times, hi)]
+                if parsed
+            ]
+            windows.append((metrics, logs))
+        
+        logger.debug(f"Built {len(windows)} history windows over {span_minutes} minutes")
+        return windows
+    
     def get_log_patterns(self, window_minutes: int = 5) -> List[Dict]:
         """Get log patterns from CloudWatch Logs"""
         try:
@@ -210,8 +279,36 @@ class CloudWatchClient:
         except Exception as e:
             logger.error(f"Failed to put custom metric {metric_name}: {str(e)}")
     
+    def put_metric_data_batch(self, metrics: Sequence[Tuple[str, float, str, float]]):
+        """Put buffered (name, value, unit, epoch seconds) metrics in as few calls as possible"""
+        dimensions = [{'Name': 'InstanceId', 'Value': self.config['instance_id']}]
+        metric_data = [
+            {
+                'MetricName': name,
+                'Value': value,
+                'Unit': unit,
+                'Timestamp': datetime.utcfromtimestamp(ts),
+                'Dimensions': dimensions
+            }
+            for name, value, unit, ts in metrics
+        ]
+        
+        # PutMetricData accepts at most 1000 entries per request
+        for start in range(0, len(metric_data), 1000):
+            chunk = metric_data[start:start + 1000]
+            try:
+                self.cloudwatch.put_metric_data(Namespace='Custom/ML', MetricData=chunk)
+                logger.debug(f"Put {len(chunk)} custom metrics")
+            except Exception as e:
+                logger.error(f"Failed to put {len(chunk)} custom metrics: {str(e)}")
+    
     def _get_logs_from_group(self, log_group_name: str, start_time: datetime, end_time: datetime) -> List[str]:
         """Get logs from a specific log group"""
+        return [event['message'] for event in self._get_log_events_from_group(log_group_name, start_time, end_time)]
+    
+    def _get_log_events_from_group(self, log_group_name: str, start_time: datetime, end_time: datetime,
+                                   limit: int = 100) -> List[Dict]:
+        """Get raw log events (message and timestamp) from a specific log group"""
         try:
             # Get log streams
             log_streams = self.logs.describe_log_streams(
@@ -232,14 +329,12 @@ class CloudWatchClient:
                     logStreamName=stream_name,
                     startTime=int(start_time.timestamp() * 1000),
                     endTime=int(end_time.timestamp() * 1000),
-                    limit=100
+                    limit=limit
                 )
                 
                 all_log_events.extend(events.get('events', []))
             
-            # Extract messages
-            log_messages = [event['message'] for event in all_log_events]
-            return log_messages
+            return all_log_events
             
         except Exception as e:
             logger.error(f"Failed to get logs from {log_group_name}: {str(e)}")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for AnomalyDetector model loading
+"""
+
+import logging
+import os
+import pickle
+import sys
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'ml'))
+
+# The service logs to a file under /opt at import time
+with mock.patch('logging.FileHandler', lambda *args, **kwargs: logging.NullHandler()):
+    import anomaly_detector
+
+# Config as pickled by the original anomaly_model.pkl format
+BASELINE_CONFIG = {
+    'contamination': 0.1,
+    'window_size': 300,
+    'feature_count': 15,
+    'retrain_interval': 3600,
+    'min_samples': 100,
+    'risk_threshold': 50
+}
+
+@pytest.fixture
+def detector(tmp_path, monkeypatch):
+    """Detector with AWS clients mocked out and a baseline-format pickle on disk"""
+    monkeypatch.setattr(anomaly_detector, 'MODEL_DIR', str(tmp_path / 'anomaly_model'))
+    monkeypatch.setattr(anomaly_detector, 'LEGACY_MODEL_PATH', str(tmp_path / 'anomaly_model.pkl'))
+    monkeypatch.setattr(anomaly_detector, 'CloudWatchClient', mock.MagicMock)
+    monkeypatch.setattr(anomaly_detector, 'AlertManager', mock.MagicMock)
+    
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(50, 5, (200, 3)), columns=['cpu_current', 'memory_current', 'error_rate'])
+    scaler = StandardScaler().fit(data)
+    model = IsolationForest(n_estimators=10, random_state=42).fit(scaler.transform(data))
+    with open(anomaly_detector.LEGACY_MODEL_PATH, 'wb') as f:
+        pickle.dump({'model': model, 'scaler': scaler, 'config': BASELINE_CONFIG, 'feature_stats': {}}, f)
+    
+    return anomaly_detector.AnomalyDetector()
+
+def test_legacy_model_keeps_new_config_defaults(detector):
+    assert detector._load_model()
+    assert detector.is_trained
+    assert detector.config['min_samples'] == 100
+    assert detector.config['detection_interval'] == 60
+    assert detector.config['metric_batch_size'] == 20
+    
+    detector._put_metric('MLServiceHealth', 1)
+    assert len(detector._metric_buf) == 1
+
+def test_legacy_model_runs_detection_loop(detector):
+    assert detector._load_model()
+    
+    clock = [0.0]
+    
+    def sleep(seconds):
+        clock[0] += seconds
+    
+    with mock.patch('time.monotonic', lambda: clock[0]), mock.patch('time.sleep', sleep), \
+            mock.patch.object(detector, '_initial_training'), \
+            mock.patch.object(detector, '_detection_cycle', side_effect=KeyboardInterrupt) as cycle:
+        detector.run_continuous_detection()
+    
+    cycle.assert_called_once_with()
+    assert clock[0] == detector.config['detection_interval']
+
+def test_detection_cycle_flushes_metrics(detector):
+    def process_and_alert(features):
+        detector._put_metric('AnomalyRiskScore', 75.0)
+        detector._put_metric('MLServiceHealth', 1)
+    
+    with mock.patch.object(detector, 'collect_and_process_data', return_value={'cpu_current': 50.0}), \
+            mock.patch.object(detector, 'process_and_alert', side_effect=process_and_alert):
+        detector._detection_cycle()
+    
+    send = detector.cloudwatch_client.put_metric_data_batch
+    send.assert_called_once()
+    assert [name for name, *_ in send.call_args[0][0]] == ['AnomalyRiskScore', 'MLServiceHealth']
+    assert detector._metric_buf == []
+
+def test_metrics_flushed_on_sigterm_exit(detector):
+    detector._put_metric('MLServiceHealth', 1)
+    
+    with mock.patch('time.sleep', side_effect=SystemExit(0)), \
+            mock.patch.object(detector, '_initial_training'), pytest.raises(SystemExit):
+        detector.run_continuous_detection()
+    
+    detector.cloudwatch_client.put_metric_data_batch.assert_called_once()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Tests for ConfigManager environment detection
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from config import ConfigManager, Environment
+
+@pytest.fixture
+def config_path(tmp_path):
+    return str(tmp_path / 'missing.yaml')
+
+@pytest.mark.parametrize('value, environment', [
+    ('DOCKER', Environment.DOCKER),
+    ('docker', Environment.DOCKER),
+    ('AWS_EC2', Environment.AWS_EC2),
+    ('LOCAL', Environment.LOCAL),
+])
+def test_environment_variable_round_trips(monkeypatch, config_path, value, environment):
+    monkeypatch.setenv('ENVIRONMENT', value)
+    manager = ConfigManager(config_path)
+    assert manager.environment is environment
+    assert manager.environment.name == value.upper()
+
+def test_docker_is_neither_local_nor_ec2(monkeypatch, config_path):
+    monkeypatch.setenv('ENVIRONMENT', 'DOCKER')
+    manager = ConfigManager(config_path)
+    assert not manager.is_local()
+    assert not manager.is_aws_ec2()
+
+def test_unknown_environment_falls_back_to_local(monkeypatch, config_path):
+    monkeypatch.setenv('ENVIRONMENT', 'STAGING')
+    assert ConfigManager(config_path).environment is Environment.LOCAL